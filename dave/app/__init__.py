@@ -1,5 +1,4 @@
 import logging
-from logging.handlers import RotatingFileHandler
 import os
 from pathlib import Path
 from flask import Flask
@@ -7,7 +6,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import Config
-from .extensions import db, login_manager, migrate
+from .extensions import db, login_manager, migrate, response_cache
 
 logging_level_str_to_int = {
     "NOT_SET": logging.NOTSET,
@@ -23,9 +22,39 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    from app.sqlite import configure_sqlite, sqlite_engine_options
+    from app.replicas import configure_replicas, replica_binds
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config)
+    app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config)
     db.init_app(app)
+    configure_sqlite(app)
+    configure_replicas(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    response_cache.configure(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'])
+
+    from app.stamps import user_stamps
+    from app.tokencache import token_cache
+    user_stamps.configure(app.config['USER_STAMPS_PATH'])
+    token_cache.configure(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_CACHE_TTL'])
+
+    from app.jsonprovider import configure_json
+    configure_json(app)
+
+    from app.compression import content_codec
+    content_codec.configure(
+        app.config['CONTENT_CODEC'],
+        app.config['CONTENT_COMPRESSION_LEVEL'],
+        app.config['CONTENT_MIN_SIZE'],
+        app.config['CONTENT_DICTIONARIES_PATH'],
+        app.config['CONTENT_DICTIONARY']
+    )
+
+    from app.cursors import blob_cursors
+    blob_cursors.configure(app.config['CURSOR_BLOCK_SIZE'])
+
+    from app.derivatives import renderer
+    renderer.configure(app.config['DERIVATIVE_WORKERS'])
 
     # Configure login manager
     login_manager.login_view = 'auth.login' # The endpoint name for the login page
@@ -44,18 +73,20 @@ def create_app(config_class=Config):
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
 
-    file_handler = RotatingFileHandler(
-        Path(app.config['LOGS_PATH'], 'application.log'),
-        maxBytes=10240,
-        backupCount=10
-    )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    logging_level = logging_level_str_to_int.get(app.config["LOGGING_LEVEL"], logging.DEBUG)
-    file_handler.setLevel(logging_level)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging_level)
+    from app.api.async_views import configure_async_api
+    configure_async_api(app)
+
+    from app.cli import bp as cli_bp
+    app.register_blueprint(cli_bp)
+
+    from app.metrics import configure_metrics
+    configure_metrics(app)
+
+    from app.profiling import configure_profiling
+    configure_profiling(app)
+
+    from app.logs import configure_logging
+    configure_logging(app, logging_level_str_to_int.get(app.config["LOGGING_LEVEL"], logging.DEBUG))
     app.logger.info("Started!")
     app.logger.info(f"{app.config['ADMIN']}")
 
@@ -3,4 +3,4 @@ from flask import Blueprint
 bp = Blueprint('api', __name__)
 
 # Import routes at the bottom
-from app.api import routes
+from app.api import routes, tokens, users, images
@@ -0,0 +1,100 @@
+from typing import Callable
+
+from flask import Flask, abort, current_app, request, Response
+from flask_login import current_user, login_required
+
+from app.api.auth import token_auth
+from app.api.caching import versioned
+from app.api.errors import bad_request, error_response
+from app.api.images import created_image, image_content, images_page, upload_stream
+from app.api.routes import ndjson_requested, resources_page, stream_resources
+from app.asyncdb import async_db
+from app.asyncdbops import AsyncDBOps
+from app.blobstore import ImageTooLarge, InvalidImage
+from app.tools import decode_page_cursor
+
+# Endpoint -> async view replacing the sync one when API_ASYNC is set
+async_views: dict[str, Callable] = {}
+
+
+def async_view(endpoint: str) -> Callable:
+    def decorator(view: Callable) -> Callable:
+        async_views[endpoint] = view
+        return view
+    return decorator
+
+
+def page_arguments() -> tuple:
+    """(after, limit, cursor) of a listing request; raises ValueError for a bad cursor."""
+    cursor = request.args.get('cursor')
+    after = decode_page_cursor(cursor) if cursor else None
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return after, max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE'])), cursor
+
+
+@async_view('api.get_resources')
+@login_required
+@versioned(lambda: current_user)
+async def get_resources() -> Response:
+    try:
+        after, limit, cursor = page_arguments()
+    except ValueError as error:
+        return bad_request(str(error))
+    if ndjson_requested():
+        # Streamed by the server after the view returns, outside any event loop
+        return stream_resources(after)
+    rows = await AsyncDBOps.page_text_html_rows(current_user, after, limit + 1)
+    return resources_page(rows, limit, cursor)
+
+
+@async_view('api.list_images')
+@token_auth.login_required
+@versioned(token_auth.current_user)
+async def list_images() -> Response:
+    try:
+        after, limit, cursor = page_arguments()
+    except ValueError as error:
+        return bad_request(str(error))
+    rows = await AsyncDBOps.page_image_rows(token_auth.current_user(), after, limit + 1)
+    return images_page(rows, limit, cursor)
+
+
+@async_view('api.create_image')
+@token_auth.login_required
+async def create_image() -> Response:
+    upload = upload_stream()
+    if isinstance(upload, Response):
+        return upload
+    stream, image_type = upload
+    try:
+        row = await AsyncDBOps.create_image(stream, image_type, token_auth.current_user())
+    except ImageTooLarge as error:
+        return error_response(413, str(error))
+    except InvalidImage as error:
+        return bad_request(str(error))
+    return created_image(row)
+
+
+@async_view('api.get_image_content')
+@token_auth.login_required
+async def get_image_content(label: str) -> Response:
+    image = await AsyncDBOps.look_for_image(label)
+    if image is None:
+        abort(404)
+    if image.user_id != token_auth.current_user().id:
+        abort(403)
+    # The file itself is sent by the server's file wrapper, not read here
+    return image_content(image)
+
+
+def configure_async_api(app: Flask) -> None:
+    """With API_ASYNC set, serves the endpoints in async_views with their async versions."""
+    if not app.config['API_ASYNC']:
+        return
+    try:
+        import asgiref # noqa: F401
+    except ImportError:
+        raise RuntimeError("API_ASYNC needs Flask's async extra: pip install 'flask[async]'")
+    async_db.configure(app.config)
+    for endpoint, view in async_views.items():
+        app.view_functions[endpoint] = view
@@ -1,7 +1,8 @@
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth, Response
-from application.models import User
-from application.dbops import DBOps
-from application.api.errors import error_response
+from app.models import User
+from app.dbops import DBOps
+from app.tokencache import token_cache
+from app.api.errors import error_response
 
 
 basic_auth = HTTPBasicAuth()
@@ -28,7 +29,14 @@ def basic_auth_error(
 def verify_token(
     token: str
 ) -> User | None:
-    return DBOps.check_token(token)
+    if not token:
+        return None
+    user = token_cache.get(token)
+    if user is None:
+        user = DBOps.check_token(token)
+        if user is not None:
+            token_cache.set(token, user)
+    return user
 
 
 @token_auth.error_handler
@@ -0,0 +1,89 @@
+from datetime import datetime
+from functools import wraps
+from typing import Callable
+import zlib
+
+from flask import current_app, request, Response
+from werkzeug.http import is_resource_modified
+
+from app.dbops import DBOps
+from app.extensions import db, response_cache
+from app.models import User
+from app.replicas import primary_reads
+
+
+def not_modified(
+    etag: str,
+    last_modified: datetime | None
+) -> Response | None:
+    """A 304 response when the client's copy is still current (If-None-Match, If-Modified-Since), else None."""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(
+    response: Response,
+    etag: str,
+    last_modified: datetime | None
+) -> Response:
+    """Sets ETag and Last-Modified; clients may keep the response but must revalidate it."""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept')
+    return response
+
+
+def replica_lags(user: User) -> bool:
+    """Whether this request's replica reads would see an older User.version than the primary's."""
+    if not current_app.config['REPLICA_DATABASE_URIS'] or db.session().pinned():
+        return False
+    return (DBOps.user_version(user.id) or 0) < user.version
+
+
+def versioned(current_user: Callable[[], User]):
+    """
+    For views whose response only depends on the request and on data that
+    bumps User.version when it changes. The ETag is the version plus a
+    hash of the request, so unchanged data is answered with 304 before the
+    view runs. With RESPONSE_CACHE_SIZE set, serialized responses are also
+    kept per user, version and request, and replayed without the view.
+
+    The version comes from the primary. When the replica the view would read
+    from has not caught up with it yet, the view reads from the primary, so
+    a stale page is never tagged or cached under the new version.
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs) -> Response:
+            user = current_user()
+            # url_for builds absolute links from the host, and the body depends on Accept too
+            request_key = f"{request.host}{request.full_path}|{request.headers.get('Accept', '')}"
+            etag = f"{user.id}-{user.version}-{zlib.crc32(request_key.encode()):08x}"
+            response = not_modified(etag, user.last_modified)
+            if response is not None:
+                return response
+
+            cache_key = (user.id, user.version, request_key)
+            cached = response_cache.get(cache_key) if response_cache.maxsize else None
+            if cached is not None:
+                body, status, headers = cached
+                response = current_app.response_class(body, status, headers)
+            else:
+                lags = replica_lags(user)
+                if lags:
+                    with primary_reads():
+                        response = current_app.make_response(current_app.ensure_sync(view)(*args, **kwargs))
+                else:
+                    response = current_app.make_response(current_app.ensure_sync(view)(*args, **kwargs))
+                # A stream reads its rows after the view returned, outside primary_reads()
+                if response.status_code != 200 or (lags and response.is_streamed):
+                    return response
+                if response_cache.maxsize and not response.is_streamed:
+                    response_cache.set(cache_key, (response.get_data(), response.status_code, list(response.headers)))
+            return with_validators(response, etag, user.last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,438 @@
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import tarfile
+from typing import Any, BinaryIO, Generator, Tuple
+
+from flask import jsonify, request, url_for, current_app, abort, send_file, Response
+from werkzeug.http import parse_content_range_header
+from app.api import bp
+from app.api.auth import token_auth
+from app.api.caching import not_modified, versioned, with_validators
+from app.api.errors import bad_request, error_response
+from app.blobstore import BlobStore, ImageTooLarge, IngestedBlob, InvalidImage
+from app.dbops import DBOps
+from app.derivatives import DERIVATIVE_FORMATS, PILImage, Variant, renderer
+from app.metrics import metrics
+from app.models import Image, ImageType, UploadSession
+from app.serializers import AuthorURLs, image_row_to_dict, image_rows_to_dicts
+from app.tools import encode_page_cursor, decode_page_cursor
+from app.uploads import OffsetMismatch, PartialUploads, UploadBusy
+
+
+@bp.route('/image_set', methods=['POST'])
+@token_auth.login_required
+def create_image() -> Response:
+    """
+    Stores an image sent either as the raw request body (Content-Type image/*
+    or application/octet-stream), which is streamed to disk chunk by chunk,
+    or as the 'image' part of a multipart form.
+    """
+    upload = upload_stream()
+    if isinstance(upload, Response):
+        return upload
+    stream, image_type = upload
+    try:
+        image = DBOps.create_image(stream, image_type, token_auth.current_user())
+    except ImageTooLarge as error:
+        return error_response(413, str(error))
+    except InvalidImage as error:
+        return bad_request(str(error))
+    return created_image(image)
+
+
+def upload_stream() -> Tuple[BinaryIO, ImageType | None] | Response:
+    """The upload of POST /image_set and its declared type, or an error response."""
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        return request.stream, None
+    # Werkzeug spools the form to disk; refuse to even parse oversized ones
+    request.max_content_length = current_app.config['MAX_IMAGE_SIZE'] + (1 << 16)
+    image_file = request.files.get('image')
+    if image_file is None or image_file.filename == '':
+        return bad_request("No image part in the request")
+    return image_file.stream, declared_image_type(image_file.filename)
+
+
+def created_image(image: Any) -> Response:
+    """201 for an image, from the model or an IMAGE_COLUMNS row."""
+    response = jsonify(image_row_to_dict(image, AuthorURLs()))
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_image', label=image.label)
+    return response
+
+
+TAR_MIMETYPES = {'application/x-tar', 'application/tar', 'application/gzip', 'application/x-gtar'}
+
+
+def declared_image_type(filename: str) -> ImageType | None:
+    extension = '.' + filename.rsplit('.', 1)[-1].lower()
+    return ImageType(extension) if extension in set(ImageType) else None
+
+
+def ingest_upload(
+    stream: BinaryIO,
+    filename: str,
+    root: str,
+    max_size: int,
+    strip_metadata: bool
+) -> Tuple[IngestedBlob, ImageType | None]:
+    """Streams one file of a batch to the incoming directory, without fsync."""
+    ingested = BlobStore.ingest(stream, root, max_size, fsync=False, strip_metadata=strip_metadata)
+    image_type = declared_image_type(filename)
+    if image_type is not None and image_type.mimetype != ingested.image_type.mimetype:
+        BlobStore.remove(ingested.path)
+        raise InvalidImage(f"Content is {ingested.image_type.mimetype}, not {image_type.mimetype}")
+    return ingested, image_type
+
+
+def batch_files() -> Generator[Tuple[str, BinaryIO], None, None]:
+    """(filename, stream) for every file of a tar stream or of the multipart 'image' parts."""
+    if request.mimetype in TAR_MIMETYPES:
+        # Streaming mode: members must be read in order, before moving to the next one
+        with tarfile.open(fileobj=request.stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, archive.extractfile(member)
+    else:
+        request.max_content_length = current_app.config['IMAGE_BATCH_MAX_BYTES']
+        for image_file in request.files.getlist('image'):
+            yield image_file.filename or '', image_file.stream
+
+
+@bp.route('/image_set/batch', methods=['POST'])
+@token_auth.login_required
+def create_images() -> Response:
+    """
+    Stores many images sent as the 'image' parts of one multipart body or as
+    the files of a tar stream (optionally gzipped). All of them are committed
+    in one transaction; the response has one result per file, in order.
+    """
+    max_items = current_app.config['IMAGE_BATCH_MAX_ITEMS']
+    root, max_size = current_app.config['UPLOADS_FOLDER'], current_app.config['MAX_IMAGE_SIZE']
+    strip_metadata = current_app.config['STRIP_IMAGE_METADATA']
+    sequential = request.mimetype in TAR_MIMETYPES
+    results = []
+    futures = []
+    error = None
+    with ThreadPoolExecutor(current_app.config['IMAGE_BATCH_WORKERS']) as executor:
+        try:
+            for index, (filename, stream) in enumerate(batch_files()):
+                if index >= max_items:
+                    results.append({'index': index, 'status': 413, 'error': f"Batches are limited to {max_items} images"})
+                    continue
+                results.append({'index': index, 'filename': filename})
+                future = executor.submit(ingest_upload, stream, filename, root, max_size, strip_metadata)
+                futures.append((index, future))
+                if sequential:
+                    # The next tar member cannot be read before this one is consumed
+                    future.exception()
+        except tarfile.TarError as tar_error:
+            error = f"Invalid tar stream: {tar_error}"
+    uploads = []
+    positions = []
+    for index, future in futures:
+        try:
+            uploads.append(future.result())
+            positions.append(index)
+        except ImageTooLarge as image_error:
+            results[index].update(status=413, error=str(image_error))
+        except InvalidImage as image_error:
+            results[index].update(status=400, error=str(image_error))
+        except OSError as os_error:
+            current_app.logger.exception(f"Batch upload of {results[index]['filename']} failed: {os_error}")
+            results[index].update(status=500, error="Could not store the file")
+    try:
+        if error is not None:
+            return bad_request(error)
+        author = token_auth.current_user()
+        rows = DBOps.create_images(uploads, author, current_app.config['IMAGE_BATCH_WORKERS']) if uploads else []
+    finally:
+        for ingested, _ in uploads:
+            BlobStore.remove(ingested.path)
+    author_urls = AuthorURLs()
+    for index, row in zip(positions, rows):
+        results[index].update(status=201, **image_row_to_dict(row, author_urls))
+    created = len(rows)
+    response = jsonify({
+        'items': results,
+        '_meta': {'count': len(results), 'created': created, 'failed': len(results) - created}
+    })
+    response.status_code = 201 if created == len(results) else 207
+    return response
+
+
+@bp.route('/image_set', methods=['GET'])
+@token_auth.login_required
+@versioned(token_auth.current_user)
+def list_images() -> Response:
+    """The user's images newest first, one keyset page at a time (query arguments cursor, limit)."""
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after = decode_page_cursor(cursor)
+        except ValueError as error:
+            return bad_request(str(error))
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    # Fetch one extra row to learn whether a next page exists
+    rows = DBOps.page_image_rows(token_auth.current_user(), after, limit + 1)
+    return images_page(rows, limit, cursor)
+
+
+def images_page(rows: list, limit: int, cursor: str | None) -> Response:
+    """A listing page from up to limit + 1 rows; the extra row only tells that a next page exists."""
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_url = url_for('api.list_images', limit=limit, cursor=encode_page_cursor(last.timestamp, last.id))
+    response = jsonify({
+        'items': image_rows_to_dicts(rows),
+        '_meta': {'limit': limit, 'count': len(rows)},
+        'links': {
+            'self': url_for('api.list_images', limit=limit, cursor=cursor),
+            'next': next_url
+        }
+    })
+    if next_url:
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+@bp.route('/image_set/<label>', methods=['GET'])
+@token_auth.login_required
+def get_image(label: str) -> Response:
+    image = next(DBOps.look_for_image(label=label))
+    if image.user_id != token_auth.current_user().id:
+        abort(403)
+    # An image's metadata never changes after it is created
+    etag = f"image-{image.id}-{image.timestamp.timestamp():.6f}"
+    response = not_modified(etag, image.timestamp)
+    if response is None:
+        response = with_validators(jsonify(image_row_to_dict(image, AuthorURLs())), etag, image.timestamp)
+    return response
+
+
+@bp.route('/image_set/<label>', methods=['DELETE'])
+@token_auth.login_required
+def delete_image(label: str) -> tuple[str, int]:
+    """Deletes the image; its blob and renditions go once no other image shares them."""
+    image = next(DBOps.look_for_image(label=label))
+    if image.user_id != token_auth.current_user().id:
+        abort(403)
+    DBOps.delete_image(image.id)
+    return '', 204
+
+
+@bp.route('/image_set/<label>/content', methods=['GET'])
+@token_auth.login_required
+def get_image_content(label: str) -> Response:
+    """
+    The image bytes, never read into Python: either the front end serves them
+    (X-Accel-Redirect for nginx, X-Sendfile through USE_X_SENDFILE), or the
+    WSGI server's file wrapper does, with sendfile where it supports it.
+    The ETag is the content hash, so it doubles as a strong validator for
+    If-None-Match and If-Range.
+    """
+    image = next(DBOps.look_for_image(label=label))
+    if image.user_id != token_auth.current_user().id:
+        abort(403)
+    return image_content(image)
+
+
+def image_content(image: Image) -> Response:
+    blob = image.blob
+    filepath = blob.filepath()
+    max_age = current_app.config['IMAGE_CACHE_MAX_AGE']
+    accel_prefix = current_app.config['IMAGES_ACCEL_REDIRECT']
+    if accel_prefix:
+        relative = filepath.relative_to(current_app.config['UPLOADS_FOLDER']).as_posix()
+        response = Response(mimetype=image.mimetype())
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relative}"
+        response.set_etag(blob.sha256)
+        response.last_modified = blob.timestamp
+        response.make_conditional(request)
+    else:
+        response = send_file(
+            filepath,
+            mimetype=image.mimetype(),
+            download_name=f"{image.label}{blob.image_type}",
+            conditional=True,
+            etag=blob.sha256,
+            last_modified=blob.timestamp,
+            max_age=max_age
+        )
+    if response.status_code == 200:
+        metrics.count_image_io('read', blob.size)
+    return private_immutable(response)
+
+
+@bp.route('/image_set/<label>/derivative', methods=['GET'])
+@token_auth.login_required
+def get_image_derivative(label: str) -> Response:
+    """
+    Resized rendition of the image (query arguments width, format, quality).
+    The first request renders it in the process pool; if that takes longer
+    than DERIVATIVE_WAIT the answer is 202 and the client retries.
+    """
+    if PILImage is None:
+        return error_response(501, "Image derivatives need Pillow installed")
+    variant = Variant(
+        width=request.args.get('width', 256, type=int),
+        format=request.args.get('format', 'webp').lower(),
+        quality=request.args.get('quality', 80, type=int)
+    )
+    if variant.width not in current_app.config['DERIVATIVE_WIDTHS']:
+        return bad_request(f"width must be one of {current_app.config['DERIVATIVE_WIDTHS']}")
+    if variant.format not in DERIVATIVE_FORMATS:
+        return bad_request(f"format must be one of {sorted(DERIVATIVE_FORMATS)}")
+    if not 1 <= variant.quality <= 95:
+        return bad_request("quality must be between 1 and 95")
+    image = next(DBOps.look_for_image(label=label))
+    if image.user_id != token_auth.current_user().id:
+        abort(403)
+    blob = image.blob
+    filepath = blob.derivative_filepath(variant.key)
+    if not filepath.exists():
+        future = renderer.submit(blob.filepath(), filepath, variant)
+        try:
+            future.result(timeout=current_app.config['DERIVATIVE_WAIT'])
+        except TimeoutError:
+            response = jsonify({'message': "Rendering, retry shortly"})
+            response.status_code = 202
+            response.headers['Retry-After'] = '1'
+            return response
+        except BrokenProcessPool:
+            # The renderer has replaced its pool by now; the image may or may not be what killed it
+            current_app.logger.warning(f"A render process died while rendering {variant.key} of blob {blob.sha256}")
+            response = error_response(503, "Rendering failed, retry shortly")
+            response.headers['Retry-After'] = '1'
+            return response
+        except Exception as error:
+            current_app.logger.warning(f"Rendering {variant.key} of blob {blob.sha256} failed: {error}")
+            return error_response(422, "Image could not be rendered")
+        metrics.count_image_io('write', filepath.stat().st_size)
+    size = filepath.stat().st_size
+    DBOps.record_derivative(blob, variant.key, size)
+    response = send_file(
+        filepath,
+        mimetype=variant.mimetype,
+        download_name=f"{image.label}.{variant.key}",
+        conditional=True,
+        etag=f"{blob.sha256}-{variant.key}",
+        max_age=current_app.config['IMAGE_CACHE_MAX_AGE']
+    )
+    if response.status_code == 200:
+        metrics.count_image_io('read', size)
+    return private_immutable(response)
+
+
+def private_immutable(response: Response) -> Response:
+    """Bytes behind a label never change, but they are only for their owner."""
+    response.cache_control.private = True
+    response.cache_control.public = False
+    response.cache_control.max_age = current_app.config['IMAGE_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+def upload_session_response(
+    upload: UploadSession,
+    offset: int,
+    status_code: int = 200
+) -> Response:
+    response = jsonify({
+        'id': upload.id,
+        'offset': offset,
+        'size': upload.size,
+        'expiration': str(upload.expiration),
+        'links': {
+            'self': url_for('api.get_upload_session', id=upload.id),
+            'complete': url_for('api.complete_upload_session', id=upload.id)
+        }
+    })
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(offset)
+    return response
+
+
+@bp.route('/images/uploads', methods=['POST'])
+@token_auth.login_required
+def create_upload_session() -> Response:
+    """Starts a resumable upload; the body may announce 'size' and 'filename'."""
+    data = request.get_json(silent=True) or {}
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or not 0 < size <= current_app.config['MAX_IMAGE_SIZE']):
+        return bad_request("size must be a positive integer no larger than the image size limit")
+    image_type = None
+    filename = data.get('filename')
+    if filename and '.' in filename:
+        extension = '.' + filename.rsplit('.', 1)[-1].lower()
+        image_type = ImageType(extension) if extension in set(ImageType) else None
+    upload = DBOps.create_upload_session(token_auth.current_user(), size, image_type)
+    response = upload_session_response(upload, 0, 201)
+    response.headers['Location'] = url_for('api.get_upload_session', id=upload.id)
+    return response
+
+
+@bp.route('/images/uploads/<id>', methods=['GET'])
+@token_auth.login_required
+def get_upload_session(id: str) -> Response:
+    """Current offset, from which an interrupted client resumes."""
+    upload = DBOps.get_upload_session(id, token_auth.current_user())
+    return upload_session_response(upload, PartialUploads.offset(upload.filepath()))
+
+
+@bp.route('/images/uploads/<id>', methods=['PUT'])
+@token_auth.login_required
+def put_upload_chunk(id: str) -> Response:
+    """
+    Appends the body at the offset given by Content-Range (bytes start-end/total)
+    or Upload-Offset. A stale offset gets 409 with the current one.
+    """
+    upload = DBOps.get_upload_session(id, token_auth.current_user())
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is not None:
+        offset = content_range.start
+    elif request.headers.get('Upload-Offset', '').isdigit():
+        offset = int(request.headers['Upload-Offset'])
+    else:
+        return bad_request("Content-Range or Upload-Offset header required")
+    try:
+        offset = DBOps.append_upload_chunk(upload, offset, request.stream)
+    except OffsetMismatch as error:
+        return upload_session_response(upload, error.offset, 409)
+    except UploadBusy as error:
+        return error_response(409, str(error))
+    except ImageTooLarge as error:
+        return error_response(413, str(error))
+    return upload_session_response(upload, offset)
+
+
+@bp.route('/images/uploads/<id>/complete', methods=['POST'])
+@token_auth.login_required
+def complete_upload_session(id: str) -> Response:
+    """Turns the uploaded bytes into an Image and discards the session."""
+    author = token_auth.current_user()
+    upload = DBOps.get_upload_session(id, author)
+    offset = PartialUploads.offset(upload.filepath())
+    if offset == 0 or (upload.size is not None and offset != upload.size):
+        return upload_session_response(upload, offset, 409)
+    try:
+        image = DBOps.finish_upload_session(upload, author)
+    except ImageTooLarge as error:
+        return error_response(413, str(error))
+    except InvalidImage as error:
+        return bad_request(str(error))
+    response = jsonify(image_row_to_dict(image, AuthorURLs()))
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_image', label=image.label)
+    return response
+
+
+@bp.route('/images/uploads/<id>', methods=['DELETE'])
+@token_auth.login_required
+def delete_upload_session(id: str) -> tuple[str, int]:
+    upload = DBOps.get_upload_session(id, token_auth.current_user())
+    DBOps.delete_upload_session(upload)
+    return '', 204
@@ -1,24 +1,187 @@
+import io
 import os
-from flask import request, jsonify, current_app, abort
+from flask import request, jsonify, current_app, abort, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from app.api import bp
+from app.api.auth import token_auth
+from app.api.caching import versioned
+from app.api.errors import bad_request, error_response
+from app.blobstore import BlobStore
+from app.dbops import DBOps
 from app.models import User, TextHTML, Image
+from app.serializers import AuthorURLs, text_html_row_to_dict, text_html_rows_to_dicts
+from app.tools import encode_page_cursor, decode_page_cursor
 from app import db
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
 def allowed_file(filename: str) -> bool:
     """Checks if the file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 @bp.route('/text_html_set', methods=['GET'])
 @login_required # Protect API endpoint
+@versioned(lambda: current_user)
 def get_resources():
-    """Returns a list of resources accessible to the user."""
-    # Basic implementation: return all resources by the current user
-    # Add pagination, filtering, searching as needed
-    user_text_htmls = DBOps.look_for_text_html(author=current_user)
-    uth_list = [uth.to_dict() for uth in user_text_htmls]
-    return jsonify(uth_list)
+    """Returns the user's resources newest first, one keyset page at a time.
+
+    Query arguments: `cursor` (opaque, from the previous page's `next` link),
+    `limit`, and `format=ndjson` to stream every remaining row instead.
+    Conditional requests against the ETag get 304 while nothing changed.
+    """
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after = decode_page_cursor(cursor)
+        except ValueError as error:
+            return bad_request(str(error))
+
+    if ndjson_requested():
+        return stream_resources(after)
+
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    # Fetch one extra row to learn whether a next page exists
+    rows = DBOps.page_text_html_rows(current_user, after, limit + 1)
+    return resources_page(rows, limit, cursor)
+
+def ndjson_requested() -> bool:
+    return request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def stream_resources(after: tuple | None) -> Response:
+    """Every row after the cursor as NDJSON, read in batches while the response is sent."""
+    rows = DBOps.stream_text_html_rows(current_user, after, batch_size=current_app.config['API_PAGE_SIZE'])
+    author_urls = AuthorURLs()
+    lines = (current_app.json.dumps(text_html_row_to_dict(row, author_urls)) + '\n' for row in rows)
+    return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
+
+def resources_page(rows: list, limit: int, cursor: str | None) -> Response:
+    """A listing page from up to limit + 1 rows; the extra row only tells that a next page exists."""
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_url = url_for('api.get_resources', limit=limit, cursor=encode_page_cursor(last.timestamp, last.id))
+    response = jsonify({
+        'items': text_html_rows_to_dicts(rows),
+        '_meta': {'limit': limit, 'count': len(rows)},
+        'links': {
+            'self': url_for('api.get_resources', limit=limit, cursor=cursor),
+            'next': next_url
+        }
+    })
+    if next_url:
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+def batch_items():
+    """Items of an NDJSON or JSON array body; a line that is not JSON yields its ValueError."""
+    if request.mimetype == NDJSON_MIMETYPE:
+        # The raw stream's readline reads byte by byte
+        for line in io.BufferedReader(request.stream, BlobStore.chunk_size):
+            if not line.strip():
+                continue
+            try:
+                yield current_app.json.loads(line)
+            except ValueError as error:
+                yield error
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ValueError("Body must be a JSON array or NDJSON of {\"content\": ...} objects")
+        yield from items
+
+
+@bp.route('/text_html_set/batch', methods=['POST'])
+@token_auth.login_required
+def create_resources():
+    """
+    Creates many documents from an NDJSON stream or a JSON array of objects
+    with a 'content' string. Valid items are inserted in chunks of
+    TEXT_HTML_BATCH_CHUNK, each chunk in one transaction. The response has
+    one result per item, in request order. Reading stops at
+    TEXT_HTML_BATCH_MAX_ITEMS items or TEXT_HTML_BATCH_MAX_BYTES; a last
+    413 result then stands for the rest of the body.
+    """
+    author = token_auth.current_user()
+    chunk_size = current_app.config['TEXT_HTML_BATCH_CHUNK']
+    max_items = current_app.config['TEXT_HTML_BATCH_MAX_ITEMS']
+    max_bytes = current_app.config['TEXT_HTML_BATCH_MAX_BYTES']
+    request.max_content_length = max_bytes
+    author_urls = AuthorURLs()
+    results = []
+    pending = []
+
+    def insert_pending():
+        rows = DBOps.create_text_html_batch([content for _, content in pending], author)
+        for (index, _), row in zip(pending, rows):
+            results[index] = {'index': index, 'status': 201, **text_html_row_to_dict(row, author_urls)}
+        pending.clear()
+
+    try:
+        for index, item in enumerate(batch_items()):
+            if index >= max_items:
+                results.append({
+                    'index': index,
+                    'status': 413,
+                    'error': f"Batches are limited to {max_items} items; the rest of the body was not read"
+                })
+                break
+            if isinstance(item, ValueError):
+                results.append({'index': index, 'status': 400, 'error': f"Invalid JSON: {item}"})
+            elif not isinstance(item, dict) or not isinstance(item.get('content'), str):
+                results.append({'index': index, 'status': 400, 'error': "Item must be an object with a 'content' string"})
+            else:
+                results.append(None)
+                pending.append((index, item['content']))
+                if len(pending) >= chunk_size:
+                    insert_pending()
+    except ValueError as error:
+        return bad_request(str(error))
+    except RequestEntityTooLarge:
+        message = f"Batch bodies are limited to {max_bytes} bytes"
+        if not results:
+            return error_response(413, message)
+        results.append({'index': len(results), 'status': 413, 'error': f"{message}; the rest of the body was not read"})
+    if pending:
+        insert_pending()
+    created = sum(1 for result in results if result['status'] == 201)
+    response = jsonify({
+        'items': results,
+        '_meta': {'count': len(results), 'created': created, 'failed': len(results) - created}
+    })
+    response.status_code = 201 if created == len(results) else 207
+    return response
+
+
+@bp.route('/text_html_set/search', methods=['GET'])
+@login_required
+def search_resources():
+    """Ranked full-text search over the user's resources, with highlighted snippets."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return bad_request("Missing search query q")
+    limit = request.args.get('limit', 20, type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    results = DBOps.search_text_html(query, author=current_user, limit=limit)
+    return jsonify({
+        'items': [
+            {
+                'id': str(hit.id),
+                'label': hit.label,
+                'timestamp': str(hit.timestamp),
+                'rank': hit.rank,
+                'snippet': hit.snippet
+            }
+            for hit in results.hits
+        ],
+        '_meta': {'limit': limit, 'count': len(results.hits), 'truncated': results.truncated}
+    })
+
 
 @bp.route('/resources/<int:resource_id>', methods=['GET'])
 @login_required
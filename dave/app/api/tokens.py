@@ -1,12 +1,25 @@
+from datetime import datetime, timezone
+from typing import Tuple
+
 from flask import jsonify, Response
-from application.api import bp
-from application.api.auth import basic_auth, token_auth
+from app.api import bp
+from app.api.auth import basic_auth, token_auth
 
 @bp.route('/tokens', methods=['POST'])
 @basic_auth.login_required
 def get_token() -> Response:
-    token = basic_auth.current_user().get_token()
-    return jsonify({'token': token})
+    """
+    The user's token, a new one unless the current one has more than a
+    minute left; expires_in is relative, so clients need not trust their clock.
+    """
+    user = basic_auth.current_user()
+    token = user.get_token()
+    expires_at = user.token_expiration.replace(tzinfo=timezone.utc)
+    return jsonify({
+        'token': token,
+        'expires_at': expires_at.isoformat(),
+        'expires_in': int((expires_at - datetime.now(timezone.utc)).total_seconds())
+    })
 
 
 @bp.route('/tokens', methods=['DELETE'])
@@ -14,3 +27,4 @@ def get_token() -> Response:
 def revoke_token() -> Tuple[str, int]:
     token_auth.current_user().revoke_token()
     return '', 204
+
@@ -1,9 +1,12 @@
 from flask import jsonify, request, url_for, abort, current_app, Response
 from app.api import bp
 from app.api.auth import token_auth
+from app.api.caching import not_modified, with_validators
 from app.api.errors import bad_request
+from app.dbops import DBOps
 from app.extensions import db
-from app.models import User, Post, Message, Store, save_image
+from app.models import User
+from app.serializers import user_row_to_dict
 
 from datetime import datetime
 
@@ -11,14 +14,25 @@ from datetime import datetime
 @token_auth.login_required
 def get_current_user() -> Response:
     current_user = token_auth.current_user()
-    return jsonify(current_user.to_dict())
+    return user_response(current_user)
 
 
-@bp.route('/user/<int:id>', methods=['GET'])
+@bp.route('/user/<int:id>', methods=['GET'], endpoint='user')
 @token_auth.login_required
 def get_user_by_id(id: int) -> Response:
     user = DBOps.get_user_by_id(id)
-    return jsonify(user.to_dict())
+    if user is None:
+        abort(404)
+    return user_response(user)
+
+
+def user_response(user: User) -> Response:
+    """The user's representation, or 304 if the client's copy has the current version."""
+    etag = f"user-{user.id}-{user.version}"
+    response = not_modified(etag, user.last_modified)
+    if response is None:
+        response = with_validators(jsonify(user_row_to_dict(user)), etag, user.last_modified)
+    return response
 
 @bp.route('/user/<int:id>', methods=['PUT'])
 @token_auth.login_required
@@ -30,8 +44,9 @@ def update_user(id: int) -> Response:
     if 'username' in data and data['username'] != user.username and User.query.filter_by(username=data['username']).first():
         return bad_request("username update not allowed")
     user.from_dict(data, new_user=False)
+    DBOps.touch_user(user.id)
     db.session.commit()
-    return jsonify(user.to_dict())
+    return jsonify(user_row_to_dict(user))
 
 
 @bp.route('/user', methods=['POST'])
@@ -53,9 +68,9 @@ def create_user() -> Response:
     if user is None:
         return bad_request("No valid request")
     else:
-        response = jsonify(user.to_dict())
+        response = jsonify(user_row_to_dict(user))
         response.status_code = 201
-        response.headers['Location'] = url_for('api.get_user', id=user.id)
+        response.headers['Location'] = url_for('api.user', id=user.id)
         return response
 
 
@@ -0,0 +1,82 @@
+import asyncio
+import random
+from typing import Any, Dict, List
+
+import sqlalchemy as sa
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import NullPool
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:  # needs greenlet; without it the API only runs in sync mode
+    create_async_engine = None
+
+from app.extensions import db
+from app.replicas import replica_allowed
+from app.sqlite import pragma_setter, sqlite_pragmas
+
+# Async driver for each backend of SQLALCHEMY_DATABASE_URI
+async_drivers = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_url(uri: str) -> URL:
+    url = make_url(uri)
+    driver = async_drivers.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {url.get_backend_name()}; set ASYNC_DATABASE_URI")
+    return url.set(drivername=driver)
+
+
+class AsyncDatabase:
+    """
+    Async engines on the same databases as db.engine and its replicas, for
+    AsyncDBOps. Flask runs every async view in an event loop of its own,
+    and pooled asyncio connections cannot move between loops, so
+    connections are not pooled. Read sessions go to a replica under the
+    same rules as RoutingSession: not inside primary_reads(), and not
+    while the request's session or client is pinned to the primary.
+    """
+
+    def __init__(self) -> None:
+        self.engine: 'AsyncEngine | None' = None
+        self.replicas: List['AsyncEngine'] = []
+        self._sessionmaker = None
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        if create_async_engine is None:
+            raise RuntimeError("API_ASYNC needs SQLAlchemy's asyncio extension: pip install 'sqlalchemy[asyncio]'")
+        self.engine = self.create_engine(config['ASYNC_DATABASE_URI'] or async_url(config['SQLALCHEMY_DATABASE_URI']), config)
+        self.replicas = [self.create_engine(async_url(uri), config) for uri in config['REPLICA_DATABASE_URIS']]
+        self._sessionmaker = async_sessionmaker(expire_on_commit=False)
+
+    @staticmethod
+    def create_engine(uri: str | URL, config: Dict[str, Any]) -> 'AsyncEngine':
+        try:
+            engine = create_async_engine(uri, poolclass=NullPool)
+        except ImportError as error:
+            raise RuntimeError(f"API_ASYNC needs the database's async driver: {error}")
+        pragmas = sqlite_pragmas(config)
+        if pragmas and engine.dialect.name == 'sqlite':
+            sa.event.listen(engine.sync_engine, 'connect', pragma_setter(pragmas))
+        # The engine's first connection initializes its dialect under an asyncio.Lock, which is
+        # bound to the loop that made it; views racing for it from their own loops could hang
+        asyncio.run(AsyncDatabase.connect_once(engine))
+        return engine
+
+    @staticmethod
+    async def connect_once(engine: 'AsyncEngine') -> None:
+        async with engine.connect():
+            pass
+
+    def session(self, read_only: bool = False) -> 'AsyncSession':
+        """A session on the primary, or for read_only work possibly on a replica."""
+        engine = self.engine
+        if read_only and self.replicas and replica_allowed(db.session()):
+            engine = random.choice(self.replicas)
+        return self._sessionmaker(bind=engine)
+
+
+async_db = AsyncDatabase()
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from typing import BinaryIO, List, Tuple
+
+from flask import current_app
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from app.asyncdb import async_db
+from app.blobstore import BlobStore, InvalidImage
+from app.dbops import DBOps
+from app.models import User, Image, ImageType
+from app.serializers import IMAGE_COLUMNS, TEXT_HTML_COLUMNS
+
+
+class AsyncDBOps:
+    """
+    Async counterparts of the DBOps methods behind the async API views. Reads
+    run on async_db, on a replica whenever a @read_only DBOps method's would;
+    file I/O and the blob bookkeeping of uploads run in worker threads, so
+    the event loop never waits on the disk.
+    """
+
+    @staticmethod
+    async def get_user_by_id(this_id: int) -> User | None:
+        async with async_db.session(read_only=True) as session:
+            return await session.get(User, this_id)
+
+    @staticmethod
+    async def page_text_html_rows(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        limit: int = 100
+    ) -> List[sa.Row]:
+        query = DBOps.text_html_keyset(author, after, TEXT_HTML_COLUMNS).limit(limit)
+        async with async_db.session(read_only=True) as session:
+            return (await session.execute(query)).all()
+
+    @staticmethod
+    async def page_image_rows(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        limit: int = 100
+    ) -> List[sa.Row]:
+        query = DBOps.image_keyset(author, after, IMAGE_COLUMNS).limit(limit)
+        async with async_db.session(read_only=True) as session:
+            return (await session.execute(query)).all()
+
+    @staticmethod
+    async def look_for_image(label: str) -> Image | None:
+        """The image with its blob loaded, since lazy loads cannot happen outside the session."""
+        async with async_db.session(read_only=True) as session:
+            return await session.scalar(
+                sa.select(Image).where(Image.label == label).options(so.selectinload(Image.blob))
+            )
+
+    @staticmethod
+    async def create_image(
+        image_content: BinaryIO,
+        image_type: ImageType | None,
+        author: User
+    ) -> sa.Row:
+        """
+        Like DBOps.create_image. Streaming the upload to disk and the
+        transaction that places its blob happen in threads; the transaction
+        reuses DBOps.create_images, with its cursor and refcount handling.
+
+        Returns:
+            The IMAGE_COLUMNS row of the new image.
+        """
+        ingested = await asyncio.to_thread(
+            BlobStore.ingest,
+            image_content,
+            current_app.config['UPLOADS_FOLDER'],
+            current_app.config['MAX_IMAGE_SIZE'],
+            False,
+            current_app.config['STRIP_IMAGE_METADATA']
+        )
+        try:
+            if image_type is not None and image_type.mimetype != ingested.image_type.mimetype:
+                raise InvalidImage(f"Content is {ingested.image_type.mimetype}, not {image_type.mimetype}")
+            rows = await asyncio.to_thread(DBOps.create_images, [(ingested, image_type)], author, 1)
+            return rows[0]
+        finally:
+            await asyncio.to_thread(BlobStore.remove, ingested.path)
@@ -0,0 +1,152 @@
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import BinaryIO, List, NamedTuple
+
+from app.imaging import strip_jpeg_metadata
+from app.metrics import metrics
+from app.models import ImageType
+
+# Leading bytes of each accepted format
+IMAGE_MAGIC = (
+    (b'\x89PNG\r\n\x1a\n', ImageType.PNG),
+    (b'\xff\xd8\xff', ImageType.JPG),
+    (b'GIF87a', ImageType.GIF),
+    (b'GIF89a', ImageType.GIF),
+)
+MAGIC_LENGTH = max(len(magic) for magic, _ in IMAGE_MAGIC)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class IngestedBlob(NamedTuple):
+    """Upload written to a temporary file, not yet moved to its blob path."""
+    path: Path
+    sha256: str
+    size: int
+    image_type: ImageType
+
+
+class ReleasedBlob(NamedTuple):
+    """Blob deleted in the current transaction: its files go first, then its cursor is freed."""
+    cursor: int
+    filepaths: List[Path]
+
+
+class BlobStore:
+    """File operations for content-addressed image blobs."""
+    chunk_size = 1 << 16
+
+    @staticmethod
+    def sniff(head: bytes) -> ImageType | None:
+        for magic, image_type in IMAGE_MAGIC:
+            if head.startswith(magic):
+                return image_type
+        return None
+
+    @staticmethod
+    def incoming(root: str) -> Path:
+        """Scratch directory on the same filesystem as the blobs, so renames are atomic."""
+        path = Path(root, '.incoming')
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        return path
+
+    @staticmethod
+    def ingest(
+        stream: BinaryIO,
+        root: str,
+        max_size: int,
+        fsync: bool = True,
+        strip_metadata: bool = False
+    ) -> IngestedBlob:
+        """
+        Copies the stream chunk by chunk to a temporary file under root while
+        hashing it and checking its magic bytes, so memory use stays constant.
+        Batches pass fsync=False and call sync() on all their files at once.
+        With strip_metadata, JPEGs are stored without their EXIF and XMP.
+
+        Raises:
+            InvalidImage: If the content is not a PNG, JPEG or GIF.
+            ImageTooLarge: If the content is longer than max_size bytes.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        head = b''
+        image_type = None
+        descriptor, name = tempfile.mkstemp(dir=BlobStore.incoming(root), suffix='.part')
+        path = Path(name)
+        try:
+            with os.fdopen(descriptor, 'wb') as target:
+                while chunk := stream.read(BlobStore.chunk_size):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ImageTooLarge(f"Image larger than {max_size} bytes")
+                    if image_type is None:
+                        head += chunk[:MAGIC_LENGTH]
+                        if len(head) >= MAGIC_LENGTH:
+                            image_type = BlobStore.sniff(head)
+                            if image_type is None:
+                                raise InvalidImage("Content is not a PNG, JPEG or GIF image")
+                    sha256.update(chunk)
+                    target.write(chunk)
+            if image_type is None:
+                image_type = BlobStore.sniff(head)
+            if image_type is None:
+                raise InvalidImage("Content is not a PNG, JPEG or GIF image")
+            ingested = IngestedBlob(path, sha256.hexdigest(), size, image_type)
+            if strip_metadata and image_type is ImageType.JPG:
+                ingested = BlobStore.strip_metadata(ingested, root)
+                path = ingested.path
+            if fsync:
+                BlobStore.sync(path)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        metrics.count_image_io('write', size)
+        return ingested
+
+    @staticmethod
+    def strip_metadata(ingested: IngestedBlob, root: str) -> IngestedBlob:
+        """
+        Replaces an ingested JPEG by a copy without its APP1 segments, hashed
+        anew. This happens before the blob exists: its bytes are served as
+        immutable from the first response on, so they cannot be swapped later.
+        """
+        descriptor, name = tempfile.mkstemp(dir=BlobStore.incoming(root), suffix='.part')
+        os.close(descriptor)
+        stripped = Path(name)
+        try:
+            if not strip_jpeg_metadata(ingested.path, stripped):
+                stripped.unlink()
+                return ingested
+            sha256 = hashlib.sha256()
+            with open(stripped, 'rb') as source:
+                while chunk := source.read(BlobStore.chunk_size):
+                    sha256.update(chunk)
+        except BaseException:
+            stripped.unlink(missing_ok=True)
+            raise
+        ingested.path.unlink()
+        return IngestedBlob(stripped, sha256.hexdigest(), stripped.stat().st_size, ingested.image_type)
+
+    @staticmethod
+    def sync(path: Path) -> None:
+        with open(path, 'rb') as source:
+            os.fsync(source.fileno())
+
+    @staticmethod
+    def place(source: Path, filepath: Path) -> None:
+        """Atomically moves an ingested file to its blob path."""
+        filepath.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.replace(source, filepath)
+
+    @staticmethod
+    def remove(filepath: Path) -> None:
+        filepath.unlink(missing_ok=True)
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from pathlib import Path
+import signal
+
+import click
+from flask import Blueprint, current_app
+
+from app.compression import content_codec
+from app.dbops import DBOps
+from app.extensions import db
+from app.jobs import Worker
+from app.profiling import read_folded, read_slow_queries
+from app.replicas import replica_bind_keys
+from app.search import get_search_backend
+
+bp = Blueprint('cli', __name__, cli_group=None)
+
+
+@bp.cli.group()
+def search():
+    """Full-text search index commands."""
+    pass
+
+
+@search.command()
+def rebuild():
+    """Create the search index if needed and re-index every document."""
+    backend = get_search_backend()
+    backend.install()
+    backend.rebuild()
+    click.echo(f"Rebuilt the '{backend.name}' search index")
+
+
+@bp.cli.group()
+def uploads():
+    """Resumable upload commands."""
+    pass
+
+
+@uploads.command()
+def gc():
+    """Delete expired upload sessions and their partial files."""
+    total = 0
+    while removed := DBOps.expire_upload_sessions():
+        total += removed
+    click.echo(f"Removed {total} expired upload sessions")
+
+
+@bp.cli.command()
+@click.option('--processes', type=int, default=None, help='Pool size (default JOB_WORKERS).')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def worker(processes, burst):
+    """Run background jobs until interrupted."""
+    config = current_app.config
+    runner = Worker(
+        current_app._get_current_object(),
+        processes or config['JOB_WORKERS'],
+        config['JOB_POLL_INTERVAL'],
+        config['JOB_LEASE'],
+        config['JOB_BACKOFF'],
+        config['JOB_RETENTION']
+    )
+    # The first signal lets the jobs under way finish, a second one aborts them
+    def stop(signum, frame):
+        signal.signal(signum, signal.default_int_handler)
+        runner.stop()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    click.echo(f"Worker {runner.name} running with {runner.processes} processes")
+    executed = runner.run(burst=burst)
+    click.echo(f"Ran {executed} jobs")
+
+
+@bp.cli.group()
+def users():
+    """User account commands."""
+    pass
+
+
+@users.command()
+@click.option('--batch-size', type=int, default=1000, help='Users recounted per transaction.')
+def reconcile(batch_size):
+    """Recount every user's text_htmls and images and fix drifted counters."""
+    corrected = DBOps.reconcile_resource_counters(batch_size)
+    click.echo(f"Corrected the counters of {corrected} users")
+
+
+@bp.cli.group()
+def content():
+    """TextHTML content compression commands."""
+    pass
+
+
+@content.command()
+@click.option('--samples', type=int, default=10000, help='TextHTMLs sampled.')
+@click.option('--size', type=int, default=112640, help='Dictionary size in bytes.')
+def train(samples, size):
+    """Train a zstd dictionary on stored TextHTMLs."""
+    dictionary_id = content_codec.train(DBOps.sample_text_html(samples), size)
+    click.echo(f"Saved dictionary {dictionary_id}; set CONTENT_DICTIONARY={dictionary_id} "
+               f"and run 'flask content compress' to re-encode existing rows")
+
+
+@content.command()
+@click.option('--batch-size', type=int, default=500, help='TextHTMLs re-encoded per transaction.')
+def compress(batch_size):
+    """Re-encode TextHTMLs stored with another codec, dictionary or not at all."""
+    rewritten = DBOps.recompress_text_html(batch_size)
+    click.echo(f"Re-encoded {rewritten} TextHTMLs with '{content_codec.codec}'")
+
+
+@bp.cli.group()
+def replicas():
+    """Read replica commands."""
+    pass
+
+
+@replicas.command()
+def sync():
+    """Copy the primary into every SQLite replica, e.g. to try out replica routing locally."""
+    primary = db.engine
+    if primary.dialect.name != 'sqlite':
+        raise click.ClickException("Only SQLite replicas can be synced here; use the database's own replication")
+    for key in replica_bind_keys(current_app.config):
+        replica = db.engines[key]
+        if replica.dialect.name != 'sqlite':
+            click.echo(f"Skipped {key}: not SQLite")
+            continue
+        with primary.connect() as source, replica.connect() as target:
+            # The backup API copies a consistent snapshot page by page
+            source.connection.dbapi_connection.backup(target.connection.dbapi_connection)
+        click.echo(f"Copied the primary into {key} ({replica.url.database})")
+
+
+@bp.cli.group()
+def profile():
+    """Summaries of what PROFILE_SLOW_QUERY_MS and PROFILE_SAMPLE_RATE recorded."""
+    pass
+
+
+@profile.command()
+@click.option('--by', type=click.Choice(['caller', 'statement', 'endpoint']), default='caller',
+              help='What slow statements are grouped by.')
+@click.option('--limit', type=int, default=20, help='Rows shown.')
+def queries(by, limit):
+    """Slow statements grouped by the app function that issued them, by total time."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0]) # key -> [count, total ms, max ms]
+    plans = {}
+    for record in read_slow_queries(Path(current_app.config['LOGS_PATH'], 'slow_queries.jsonl')):
+        key = record[by]
+        total = totals[key]
+        total[0] += 1
+        total[1] += record['duration_ms']
+        if record['duration_ms'] >= total[2]:
+            total[2] = record['duration_ms']
+            plans[key] = record.get('plan')
+    if not totals:
+        click.echo("No slow statements logged; set PROFILE_SLOW_QUERY_MS")
+        return
+    click.echo(f"{'total ms':>12}{'count':>8}{'mean ms':>10}{'max ms':>10}  {by}")
+    for key, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1])[:limit]:
+        click.echo(f"{total:>12.1f}{count:>8}{total / count:>10.1f}{longest:>10.1f}  {key}")
+        for step in plans[key] or ():
+            click.echo(f"{'':>42}{step}")
+
+
+@profile.command()
+@click.option('--sort', type=click.Choice(['self', 'total']), default='self',
+              help='Time in the function itself, or including its callees.')
+@click.option('--limit', type=int, default=20, help='Rows shown.')
+def stacks(sort, limit):
+    """Functions that sampled requests spent the most time in, with and without their callees."""
+    interval_ms = current_app.config['PROFILE_SAMPLE_INTERVAL'] * 1000
+    inclusive, own = defaultdict(int), defaultdict(int)
+    samples = 0
+    for frames, count in read_folded(Path(current_app.config['LOGS_PATH'], 'profiles')):
+        samples += count
+        own[frames[-1]] += count
+        # Recursive functions count once per stack
+        for frame in set(frames):
+            inclusive[frame] += count
+    if not samples:
+        click.echo("No profiles recorded; set PROFILE_SAMPLE_RATE")
+        return
+    click.echo(f"{samples} samples, about {samples * interval_ms / 1000:.1f}s")
+    click.echo(f"{'total ms':>12}{'total %':>9}{'self ms':>10}{'self %':>8}  function")
+    order = (lambda frame: (own[frame], inclusive[frame])) if sort == 'self' else \
+        (lambda frame: (inclusive[frame], own[frame]))
+    for frame in sorted(inclusive, key=order, reverse=True)[:limit]:
+        count = inclusive[frame]
+        click.echo(f"{count * interval_ms:>12.0f}{count / samples:>9.1%}{own[frame] * interval_ms:>10.0f}"
+                   f"{own[frame] / samples:>8.1%}  {frame}")
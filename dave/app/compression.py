@@ -0,0 +1,172 @@
+from pathlib import Path
+import sqlite3
+from threading import Lock
+from typing import Any, List
+import zlib
+
+import sqlalchemy as sa
+from sqlalchemy.engine import AdaptedConnection
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; without it content is compressed with zlib
+    zstandard = None
+
+from app.tools import LoggedException
+
+# Stored values start with MAGIC and a codec byte. Anything else is plaintext:
+# TEXT rows written before compression, or UTF-8 bytes too short to compress.
+MAGIC = b'\x00dz'
+ZLIB = b'z'
+ZSTD = b's'
+
+
+class ContentCodec:
+    """
+    Compresses TextHTML.content at rest. zstd frames name the dictionary they
+    were compressed with, so rows written with an older dictionary, with zlib,
+    or before compression was enabled all stay readable.
+    """
+
+    def __init__(self) -> None:
+        self.codec = 'none'
+        self.level = 0
+        self.min_size = 0
+        self.dictionaries_path: Path | None = None
+        self.dictionary_id = 0
+        self._compressor = None
+        self._decompressors: dict[int, Any] = {}
+        self._lock = Lock()
+
+    def configure(
+        self,
+        codec: str,
+        level: int,
+        min_size: int,
+        dictionaries_path: str,
+        dictionary_id: int = 0
+    ) -> None:
+        """codec is 'zstd', 'zlib', 'none' or 'auto' (zstd when installed, else zlib)."""
+        if codec == 'auto':
+            codec = 'zstd' if zstandard is not None else 'zlib'
+        if codec == 'zstd' and zstandard is None:
+            raise LoggedException("ContentCodec: CONTENT_CODEC is 'zstd' but zstandard is not installed")
+        with self._lock:
+            self.codec = codec
+            self.level = level
+            self.min_size = min_size
+            self.dictionaries_path = Path(dictionaries_path)
+            self.dictionary_id = dictionary_id if codec == 'zstd' else 0
+            self._compressor = None
+            self._decompressors = {}
+
+    def encode(self, text: str | None) -> bytes | None:
+        if text is None:
+            return None
+        raw = text.encode('utf-8')
+        if self.codec == 'none' or len(raw) < self.min_size:
+            return raw
+        if self.codec == 'zlib':
+            return MAGIC + ZLIB + zlib.compress(raw, self.level or zlib.Z_DEFAULT_COMPRESSION)
+        return MAGIC + ZSTD + self.compressor().compress(raw)
+
+    def decode(self, value: str | bytes | None) -> str | None:
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if not value.startswith(MAGIC):
+            return value.decode('utf-8')
+        codec, payload = value[len(MAGIC):len(MAGIC) + 1], value[len(MAGIC) + 1:]
+        if codec == ZLIB:
+            return zlib.decompress(payload).decode('utf-8')
+        if codec == ZSTD:
+            if zstandard is None:
+                raise LoggedException("ContentCodec: found zstd content but zstandard is not installed")
+            dictionary_id = zstandard.get_frame_parameters(payload).dict_id
+            return self.decompressor(dictionary_id).decompress(payload).decode('utf-8')
+        raise LoggedException(f"ContentCodec: unknown codec {codec!r}")
+
+    def is_current(self, value: str | bytes | None) -> bool:
+        """Whether value is already stored the way encode() would store it now."""
+        if value is None:
+            return True
+        if isinstance(value, str):
+            return False
+        value = bytes(value)
+        if not value.startswith(MAGIC):
+            return self.codec == 'none' or len(value) < self.min_size
+        codec = value[len(MAGIC):len(MAGIC) + 1]
+        if self.codec == 'zlib':
+            return codec == ZLIB
+        if self.codec == 'zstd' and codec == ZSTD:
+            return zstandard.get_frame_parameters(value[len(MAGIC) + 1:]).dict_id == self.dictionary_id
+        return False
+
+    def compressor(self):
+        with self._lock:
+            if self._compressor is None:
+                dictionary = self.dictionary(self.dictionary_id) if self.dictionary_id else None
+                self._compressor = zstandard.ZstdCompressor(level=self.level or 3, dict_data=dictionary)
+            return self._compressor
+
+    def decompressor(self, dictionary_id: int):
+        with self._lock:
+            decompressor = self._decompressors.get(dictionary_id)
+            if decompressor is None:
+                dictionary = self.dictionary(dictionary_id) if dictionary_id else None
+                decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+                self._decompressors[dictionary_id] = decompressor
+            return decompressor
+
+    def dictionary(self, dictionary_id: int):
+        filepath = Path(self.dictionaries_path, f"{dictionary_id}.zdict")
+        try:
+            return zstandard.ZstdCompressionDict(filepath.read_bytes())
+        except FileNotFoundError:
+            raise LoggedException(f"ContentCodec: dictionary {filepath} is missing")
+
+    def train(self, samples: List[str], size: int) -> int:
+        """Trains a zstd dictionary on samples, saves it and returns its id."""
+        if zstandard is None:
+            raise LoggedException("ContentCodec: training a dictionary needs zstandard")
+        dictionary = zstandard.train_dictionary(size, [sample.encode('utf-8') for sample in samples])
+        self.dictionaries_path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        Path(self.dictionaries_path, f"{dictionary.dict_id()}.zdict").write_bytes(dictionary.as_bytes())
+        return dictionary.dict_id()
+
+
+content_codec = ContentCodec()
+
+
+class CompressedText(sa.TypeDecorator):
+    """
+    Text column whose values are compressed by content_codec. SQL sees only
+    the compressed bytes, so LIKE and indexes on the column cannot match the
+    text; searches go through the indexes in app.search, which DBOps
+    writes with the plaintext, or LikeSearchBackend.
+    """
+    impl = sa.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: str | None, dialect: sa.Dialect) -> bytes | None:
+        return content_codec.encode(value)
+
+    def process_result_value(self, value: str | bytes | None, dialect: sa.Dialect) -> str | None:
+        return content_codec.decode(value)
+
+
+def inflate(value: str | bytes | None) -> str | None:
+    """SQLite function dave_inflate: plaintext of a stored value, for the FTS5 index."""
+    return content_codec.decode(value)
+
+
+@sa.event.listens_for(sa.Engine, 'connect')
+def register_sqlite_functions(dbapi_connection: Any, connection_record: Any) -> None:
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('dave_inflate', 1, inflate, deterministic=True)
+    elif isinstance(dbapi_connection, AdaptedConnection) and \
+            type(dbapi_connection.driver_connection).__module__.startswith('aiosqlite'):
+        # The async engine's connections (AsyncDBOps)
+        dbapi_connection.run_async(
+            lambda connection: connection.create_function('dave_inflate', 1, inflate, deterministic=True)
+        )
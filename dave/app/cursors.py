@@ -0,0 +1,119 @@
+import atexit
+import os
+from threading import Lock
+from typing import List
+
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Blob, CursorSequence, FreeCursor
+from app.tools import LoggedException
+
+
+class CursorAllocator:
+    """
+    Hands out unique cursors in the 24-bit space that base_256 encodes.
+
+    Every reservation is one short transaction of its own, so a cursor is
+    never issued twice even if the caller's transaction rolls back. Freed
+    cursors are issued again before the sequence advances. With a block size
+    above one, each process reserves cursors in blocks and hands them out
+    from memory; unused ones go back to the free list at exit.
+    """
+    limit = 1 << 24
+
+    def __init__(self, name: str, seed_column: sa.Column, block_size: int = 1) -> None:
+        self.name = name
+        self.seed_column = seed_column
+        self.block_size = block_size
+        self._block: List[int] = []
+        self._engine: sa.Engine | None = None
+        self._pid = os.getpid()
+        self._lock = Lock()
+        atexit.register(self.close)
+
+    def configure(self, block_size: int) -> None:
+        with self._lock:
+            self.block_size = max(1, block_size)
+
+    def allocate(self) -> int:
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> List[int]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child must not reuse the block its parent still holds
+                self._block = []
+                self._pid = os.getpid()
+            if len(self._block) < count:
+                wanted = max(count - len(self._block), self.block_size)
+                try:
+                    self._block.extend(self._reserve(wanted))
+                except sa.exc.IntegrityError:
+                    # Lost the race to create the sequence row; it exists now
+                    self._block.extend(self._reserve(wanted))
+            cursors, self._block = self._block[:count], self._block[count:]
+            return cursors
+
+    def giveback(self, cursor: int) -> None:
+        """Returns a cursor that was allocated but never committed."""
+        with self._lock:
+            self._block.append(cursor)
+
+    def release(self, cursors: List[int]) -> None:
+        """
+        Frees cursors in a transaction of its own. Only call it once their
+        blob rows are committed away and their files removed: from then on
+        another process may place a new blob at the same path.
+        """
+        if not cursors:
+            return
+        with db.engine.begin() as connection:
+            connection.execute(sa.insert(FreeCursor), [{'name': self.name, 'cursor': cursor} for cursor in cursors])
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._block or self._engine is None or self._pid != os.getpid():
+                return
+            with self._engine.begin() as connection:
+                connection.execute(
+                    sa.insert(FreeCursor),
+                    [{'name': self.name, 'cursor': cursor} for cursor in self._block]
+                )
+            self._block = []
+
+    def _reserve(self, count: int) -> List[int]:
+        self._engine = db.engine
+        with self._engine.begin() as connection:
+            reused = connection.scalars(
+                sa.delete(FreeCursor)
+                .where(FreeCursor.name == self.name)
+                .where(FreeCursor.cursor.in_(
+                    sa.select(FreeCursor.cursor)
+                    .where(FreeCursor.name == self.name)
+                    .order_by(FreeCursor.cursor)
+                    .limit(count)
+                ))
+                .returning(FreeCursor.cursor)
+            ).all()
+            missing = count - len(reused)
+            if missing == 0:
+                return sorted(reused)
+            next_value = connection.scalar(
+                sa.update(CursorSequence)
+                .where(CursorSequence.name == self.name)
+                .values(next_value=CursorSequence.next_value + missing)
+                .returning(CursorSequence.next_value)
+            )
+            if next_value is None:
+                # First use on a database created without migrations
+                seed = connection.scalar(sa.select(sa.func.coalesce(sa.func.max(self.seed_column), -1) + 1))
+                next_value = seed + missing
+                connection.execute(sa.insert(CursorSequence).values(name=self.name, next_value=next_value))
+            if next_value > self.limit:
+                message = f"CursorAllocator: the '{self.name}' cursor space is exhausted"
+                raise LoggedException(message)
+        return sorted(reused) + list(range(next_value - missing, next_value))
+
+
+blob_cursors = CursorAllocator('blob', Blob.cursor)
@@ -1,14 +1,28 @@
+import itertools
 import pdb
 
-from typing import Generator, List
-from io import BytesIO
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import BinaryIO, Generator, List, Tuple
 
-from flask import abort
+from flask import abort, current_app
 import sqlalchemy as sa
+import sqlalchemy.orm as so
 
-from app.models import User, TextHTML, Image, ImageType
-from app.tools import generate_random_label
-from app.extensions import db
+from app.blobstore import BlobStore, IngestedBlob, InvalidImage, ReleasedBlob
+from app.compression import content_codec
+from app.cursors import blob_cursors
+from app.jobs import JobQueue
+from app.models import User, TextHTML, Image, ImageType, Blob, Derivative, UploadSession
+from app.replicas import read_only
+from app.search import SearchResults, get_search_backend
+from app.serializers import IMAGE_COLUMNS, TEXT_HTML_COLUMNS
+from app.stamps import user_stamps
+from app.uploads import PartialUploads
+from app.tools import LoggedException, generate_random_label, generate_random_labels
+from app.extensions import db, response_cache
 
 
 class DBOps:
@@ -36,22 +50,30 @@ class DBOps:
         return user
 
     @staticmethod
+    @read_only
     def get_user_by_id(this_id: int) -> User:
-        user = User.query.filter_by(id=this_id).first()
+        user = db.session.get(User, this_id)
         return user
 
     @staticmethod
+    @read_only
     def get_user_by_username(this_username: str) -> User | None:
         user = User.query.filter_by(username=this_username).first()
         return user
 
     @staticmethod
+    @read_only
     def get_user_by_email(this_email: str) -> User | None:
         user = User.query.filter_by(email=this_email).first()
         return user
 
     @staticmethod
     def check_token(token: str) -> User | None:
+        """
+        The user holding this unexpired token, in one lookup on the unique
+        token index. Always on the primary, so a revocation or a new token
+        counts at once in every worker.
+        """
         user = db.session.scalar(sa.select(User).where(User.token == token))
         if user is None or user.token_expiration.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
             return None
@@ -64,10 +86,142 @@ class DBOps:
         if user:
             user.delete()
             db.session.commit()
+            DBOps.invalidate_responses(this_id)
         else:
             message = f"DBOps.delete_user: User.id == {this_id} doesn't exist"
             raise LoggedException(message)
 
+    @staticmethod
+    def count_resources(
+        user_id: int,
+        text_htmls: int = 0,
+        images: int = 0
+    ) -> None:
+        """
+        Adjusts the user's resource counters as part of the caller's
+        transaction, and bumps their version since their listings changed.
+        """
+        db.session.execute(
+            sa.update(User)
+            .where(User.id == user_id)
+            .values(
+                text_htmls_counter=User.text_htmls_counter + text_htmls,
+                images_counter=User.images_counter + images,
+                version=User.version + 1,
+                last_modified=datetime.utcnow()
+            )
+        )
+        user_stamps.changed(db.session, user_id)
+        DBOps.invalidate_responses(user_id)
+
+    @staticmethod
+    def touch_user(user_id: int) -> None:
+        """Bumps the user's version, as part of the caller's transaction, after their profile changed."""
+        db.session.execute(
+            sa.update(User)
+            .where(User.id == user_id)
+            .values(version=User.version + 1, last_modified=datetime.utcnow())
+        )
+        user_stamps.changed(db.session, user_id)
+        DBOps.invalidate_responses(user_id)
+
+    @staticmethod
+    def invalidate_responses(user_id: int) -> None:
+        """
+        Drops this process's cached responses for the user. Entries are keyed
+        by the user's version too, so other processes never serve them once
+        the new version is committed; they merely expire.
+        """
+        response_cache.pop_matching(lambda key: key[0] == user_id)
+
+    @staticmethod
+    def reconcile_resource_counters(batch_size: int = 1000) -> int:
+        """
+        Recounts every user's resources in batches of users, fixing counters
+        that drifted (e.g. after rows were changed outside DBOps). Corrected
+        users get a new version, like after count_resources.
+
+        Returns:
+            The number of users whose counters were corrected.
+        """
+        text_htmls = (
+            sa.select(sa.func.count(TextHTML.id)).where(TextHTML.user_id == User.id).scalar_subquery()
+        )
+        images = (
+            sa.select(sa.func.count(Image.id)).where(Image.user_id == User.id).scalar_subquery()
+        )
+        corrected = 0
+        last_id = 0
+        while True:
+            ids = db.session.scalars(
+                sa.select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            last_id = ids[-1]
+            changed = db.session.scalars(
+                sa.update(User)
+                .where(User.id.in_(ids))
+                .where(sa.or_(User.text_htmls_counter != text_htmls, User.images_counter != images))
+                .values(
+                    text_htmls_counter=text_htmls,
+                    images_counter=images,
+                    version=User.version + 1,
+                    last_modified=datetime.utcnow()
+                )
+                .returning(User.id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            for user_id in changed:
+                user_stamps.changed(db.session, user_id)
+                DBOps.invalidate_responses(user_id)
+            db.session.commit()
+            corrected += len(changed)
+        return corrected
+
+    @staticmethod
+    @read_only
+    def sample_text_html(
+        limit: int
+    ) -> List[str]:
+        """Contents of up to limit random TextHTMLs, e.g. to train a compression dictionary."""
+        return db.session.scalars(
+            sa.select(TextHTML.content).order_by(sa.func.random()).limit(limit)
+        ).all()
+
+    @staticmethod
+    def recompress_text_html(
+        batch_size: int = 500
+    ) -> int:
+        """
+        Re-encodes, in batches of ids, the contents not stored the way
+        content_codec would store them now: rows from before compression,
+        or compressed with another codec or dictionary.
+
+        Returns:
+            The number of rows rewritten.
+        """
+        # NullType skips CompressedText's decoding, to look at the stored values
+        stored = sa.type_coerce(TextHTML.content, sa.types.NullType())
+        rewritten = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                sa.select(TextHTML.id, stored).where(TextHTML.id > last_id).order_by(TextHTML.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            changes = [
+                {'id': id, 'content': content_codec.decode(value)}
+                for id, value in rows if not content_codec.is_current(value)
+            ]
+            if changes:
+                db.session.execute(sa.update(TextHTML), changes)
+                db.session.commit()
+                rewritten += len(changes)
+        return rewritten
+
     @staticmethod
     def create_text_html(
         content: str,
@@ -76,51 +230,521 @@ class DBOps:
         label = generate_random_label()
         row = TextHTML(label=label, content=content, author=author)
         db.session.add(row)
-        db.commit()
+        db.session.flush()
+        get_search_backend().index([(row.id, content)])
+        DBOps.count_resources(author.id, text_htmls=1)
+        db.session.commit()
         return row
 
     @staticmethod
+    def create_text_html_batch(
+        contents: List[str],
+        author: User
+    ) -> List[sa.Row]:
+        """
+        Inserts the documents as one executemany and one commit, with labels
+        generated in bulk.
+
+        Returns:
+            (id, label, timestamp, user_id) rows in the order of contents.
+        """
+        timestamp = datetime.utcnow()
+        for attempt in range(3):
+            labels = generate_random_labels(len(contents))
+            try:
+                rows = db.session.execute(
+                    sa.insert(TextHTML).returning(*TEXT_HTML_COLUMNS, sort_by_parameter_order=True),
+                    [
+                        {'label': label, 'content': content, 'user_id': author.id, 'timestamp': timestamp}
+                        for label, content in zip(labels, contents)
+                    ]
+                ).all()
+                get_search_backend().index((row.id, content) for row, content in zip(rows, contents))
+                DBOps.count_resources(author.id, text_htmls=len(rows))
+                db.session.commit()
+                return rows
+            except sa.exc.IntegrityError:
+                # A label collided with an existing one; draw a new set
+                db.session.rollback()
+        message = f"DBOps.create_text_html_batch: could not insert {len(contents)} documents"
+        raise LoggedException(message)
+
+    @staticmethod
+    @read_only
     def look_for_text_html(
         label: str | None = None,
         content: str | None = None,
         author: User | None = None,
         batch_size: int = 100
     ) -> Generator[TextHTML, None, None]:
+        """With content, every match of a search, best first, loaded batch_size rows at a time."""
         if label:
             row = TextHTML.query.filter_by(label=label).first_or_404()
             yield row
         elif content:
-            query = TextHTML.query.filter_by(TextHTML.content.contains(content))
-            for row in query.yield_per(100):
-                yield row
+            author_id = author.id if author else None
+            matches = get_search_backend().matches(content, author_id=author_id)
+            while ids := list(itertools.islice(matches, batch_size)):
+                rows = {
+                    row.id: row
+                    for row in db.session.scalars(
+                        sa.select(TextHTML).where(TextHTML.id.in_(ids)).options(so.selectinload(TextHTML.author))
+                    )
+                }
+                for identifier in ids:
+                    yield rows[identifier]
         elif author:
             for row in author.text_htmls:
                 yield row
         else:
             yield from ()
 
+    @staticmethod
+    def text_html_keyset(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        columns: Tuple = (TextHTML,)
+    ) -> sa.Select:
+        """Author's rows newest first, strictly after the (timestamp, id) position."""
+        query = sa.select(*columns).where(TextHTML.user_id == author.id)
+        if after:
+            timestamp, identifier = after
+            query = query.where(sa.or_(
+                TextHTML.timestamp < timestamp,
+                sa.and_(TextHTML.timestamp == timestamp, TextHTML.id < identifier)
+            ))
+        return query.order_by(TextHTML.timestamp.desc(), TextHTML.id.desc())
+
+    @staticmethod
+    @read_only
+    def user_version(user_id: int) -> int | None:
+        """User.version as seen by the reads of @read_only methods, which may come from a lagging replica."""
+        return db.session.scalar(sa.select(User.version).where(User.id == user_id))
+
+    @staticmethod
+    @read_only
+    def page_text_html(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        limit: int = 100
+    ) -> List[TextHTML]:
+        query = DBOps.text_html_keyset(author, after).limit(limit)
+        return list(db.session.scalars(query))
+
+    @staticmethod
+    @read_only
+    def stream_text_html(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        batch_size: int = 100
+    ) -> Generator[TextHTML, None, None]:
+        query = DBOps.text_html_keyset(author, after).execution_options(yield_per=batch_size)
+        for row in db.session.scalars(query):
+            yield row
+
+    @staticmethod
+    @read_only
+    def page_text_html_rows(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        limit: int = 100
+    ) -> List[sa.Row]:
+        """Like page_text_html, as TEXT_HTML_COLUMNS tuples for serialization."""
+        query = DBOps.text_html_keyset(author, after, TEXT_HTML_COLUMNS).limit(limit)
+        return db.session.execute(query).all()
+
+    @staticmethod
+    @read_only
+    def stream_text_html_rows(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        batch_size: int = 100
+    ) -> Generator[sa.Row, None, None]:
+        query = DBOps.text_html_keyset(author, after, TEXT_HTML_COLUMNS).execution_options(yield_per=batch_size)
+        yield from db.session.execute(query)
+
+    @staticmethod
+    @read_only
+    def search_text_html(
+        query: str,
+        author: User | None = None,
+        limit: int = 20
+    ) -> SearchResults:
+        author_id = author.id if author else None
+        return get_search_backend().search(query, author_id=author_id, limit=limit)
+
     @staticmethod
     def delete_text_html(id: int) -> None:
         text_html = TextHTML.query.get_or_404(id)
-        text_html.delete()
+        get_search_backend().unindex([(text_html.id, text_html.content)])
+        db.session.delete(text_html)
+        DBOps.count_resources(text_html.user_id, text_htmls=-1)
         db.session.commit()
 
     @staticmethod
     def create_image(
-        image_content: BytesIO,
-        image_type: ImageType,
+        image_content: BinaryIO,
+        image_type: ImageType | None,
         author: User
     ) -> Image:
-        label = create_label()
-        cursor = db.session.query(Image).count()
-        image = Image(label=label, cursor=cursor, image_type=image_type, author=author)
-        db.session.add(image)
+        """Streams the upload to disk once; re-uploads of known bytes only add an Image row."""
+        ingested = BlobStore.ingest(
+            image_content,
+            current_app.config['UPLOADS_FOLDER'],
+            current_app.config['MAX_IMAGE_SIZE'],
+            strip_metadata=current_app.config['STRIP_IMAGE_METADATA']
+        )
+        try:
+            if image_type is not None and image_type.mimetype != ingested.image_type.mimetype:
+                raise InvalidImage(f"Content is {ingested.image_type.mimetype}, not {image_type.mimetype}")
+            for attempt in range(3):
+                blob, placed = DBOps.acquire_blob(ingested)
+                cursor, filepath = blob.cursor, blob.filepath()
+                image = Image(
+                    label=generate_random_label(),
+                    blob=blob,
+                    image_type=image_type or ingested.image_type,
+                    author=author
+                )
+                db.session.add(image)
+                DBOps.count_resources(author.id, images=1)
+                if placed:
+                    db.session.flush()
+                    JobQueue.enqueue(
+                        'image.postprocess',
+                        {'blob_id': blob.id},
+                        max_attempts=current_app.config['JOB_MAX_ATTEMPTS']
+                    )
+                try:
+                    db.session.commit()
+                    return image
+                except sa.exc.IntegrityError:
+                    # Another upload of the same bytes won the race; reference its blob instead
+                    db.session.rollback()
+                    if placed:
+                        BlobStore.place(filepath, ingested.path)
+                        blob_cursors.giveback(cursor)
+        finally:
+            BlobStore.remove(ingested.path)
+        message = f"DBOps.create_image: could not store blob {ingested.sha256}"
+        raise LoggedException(message)
+
+    @staticmethod
+    def create_images(
+        uploads: List[Tuple[IngestedBlob, ImageType | None]],
+        author: User,
+        workers: int = 4
+    ) -> List[sa.Row]:
+        """
+        Stores many ingested uploads in one transaction. New blobs get their
+        cursors as one block, their files are synced and moved into place by
+        a thread pool, and every row is written with bulk statements.
+
+        Returns:
+            IMAGE_COLUMNS rows in the order of uploads.
+        """
+        references = Counter(ingested.sha256 for ingested, _ in uploads)
+        distinct = {}
+        for ingested, _ in uploads:
+            distinct.setdefault(ingested.sha256, ingested)
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(BlobStore.sync, [ingested.path for ingested in distinct.values()]))
+            for attempt in range(3):
+                existing = dict(db.session.execute(
+                    sa.select(Blob.sha256, Blob.id).where(Blob.sha256.in_(list(distinct)))
+                ).all())
+                fresh = [ingested for sha256, ingested in distinct.items() if sha256 not in existing]
+                blobs = [
+                    Blob(
+                        sha256=ingested.sha256,
+                        cursor=cursor,
+                        image_type=ingested.image_type,
+                        size=ingested.size,
+                        refcount=references[ingested.sha256]
+                    )
+                    for ingested, cursor in zip(fresh, blob_cursors.allocate_many(len(fresh)))
+                ]
+                moves = [(ingested.path, blob.filepath()) for ingested, blob in zip(fresh, blobs)]
+                list(executor.map(lambda move: BlobStore.place(*move), moves))
+                try:
+                    rows = DBOps.insert_images(uploads, author, existing, blobs, references)
+                    if rows is not None:
+                        db.session.commit()
+                        return rows
+                except sa.exc.IntegrityError:
+                    pass
+                # Lost a race with another upload or delete of the same bytes; undo and retry
+                db.session.rollback()
+                list(executor.map(lambda move: BlobStore.place(move[1], move[0]), moves))
+                for blob in blobs:
+                    blob_cursors.giveback(blob.cursor)
+        message = f"DBOps.create_images: could not store {len(uploads)} images"
+        raise LoggedException(message)
+
+    @staticmethod
+    def insert_images(
+        uploads: List[Tuple[IngestedBlob, ImageType | None]],
+        author: User,
+        existing: dict[str, int],
+        blobs: List[Blob],
+        references: Counter
+    ) -> List[sa.Row] | None:
+        """Bulk statements of create_images; None if an existing blob was deleted meanwhile."""
+        blob_ids = dict(existing)
+        for sha256, blob_id in existing.items():
+            result = db.session.execute(
+                sa.update(Blob).where(Blob.id == blob_id).values(refcount=Blob.refcount + references[sha256])
+            )
+            if result.rowcount != 1:
+                return None
+        if blobs:
+            now = datetime.utcnow()
+            blob_ids.update(db.session.execute(
+                sa.insert(Blob).returning(Blob.sha256, Blob.id, sort_by_parameter_order=True),
+                [
+                    {
+                        'sha256': blob.sha256,
+                        'cursor': blob.cursor,
+                        'image_type': blob.image_type,
+                        'size': blob.size,
+                        'refcount': blob.refcount,
+                        'timestamp': now
+                    }
+                    for blob in blobs
+                ]
+            ).all())
+        timestamp = datetime.utcnow()
+        rows = db.session.execute(
+            sa.insert(Image).returning(*IMAGE_COLUMNS, sort_by_parameter_order=True),
+            [
+                {
+                    'label': label,
+                    'image_type': image_type or ingested.image_type,
+                    'blob_id': blob_ids[ingested.sha256],
+                    'user_id': author.id,
+                    'timestamp': timestamp
+                }
+                for (ingested, image_type), label in zip(uploads, generate_random_labels(len(uploads)))
+            ]
+        ).all()
+        DBOps.count_resources(author.id, images=len(rows))
+        JobQueue.enqueue_many(
+            'image.postprocess',
+            [{'blob_id': blob_ids[blob.sha256]} for blob in blobs],
+            max_attempts=current_app.config['JOB_MAX_ATTEMPTS']
+        )
+        return rows
+
+    @staticmethod
+    def acquire_blob(
+        ingested: IngestedBlob
+    ) -> Tuple[Blob, bool]:
+        """Existing blob with one more reference, or a new one moved into place."""
+        blob = db.session.scalar(sa.select(Blob).where(Blob.sha256 == ingested.sha256))
+        if blob is not None:
+            result = db.session.execute(
+                sa.update(Blob).where(Blob.id == blob.id).values(refcount=Blob.refcount + 1)
+            )
+            if result.rowcount == 1:
+                return blob, False
+        cursor = blob_cursors.allocate()
+        blob = Blob(
+            sha256=ingested.sha256,
+            cursor=cursor,
+            image_type=ingested.image_type,
+            size=ingested.size,
+            refcount=1
+        )
+        try:
+            BlobStore.place(ingested.path, blob.filepath())
+        except OSError:
+            blob_cursors.giveback(cursor)
+            raise
+        db.session.add(blob)
+        return blob, True
+
+    @staticmethod
+    def release_blob(blob: Blob) -> ReleasedBlob | None:
+        """
+        Drops one reference. When none remain, deletes the blob and its
+        derivatives in the current transaction and returns what
+        DBOps.discard_blob_files has to clean up after the commit.
+        """
+        db.session.execute(sa.update(Blob).where(Blob.id == blob.id).values(refcount=Blob.refcount - 1))
+        refcount = db.session.scalar(sa.select(Blob.refcount).where(Blob.id == blob.id))
+        if refcount > 0:
+            return None
+        variants = db.session.scalars(sa.select(Derivative.variant).where(Derivative.blob_id == blob.id)).all()
+        filepaths = [blob.filepath()] + [blob.derivative_filepath(variant) for variant in variants]
+        db.session.execute(sa.delete(Derivative).where(Derivative.blob_id == blob.id))
+        db.session.delete(blob)
+        return ReleasedBlob(blob.cursor, filepaths)
+
+    @staticmethod
+    def discard_blob_files(released: ReleasedBlob | None) -> None:
+        """
+        Removes the files of a blob released by a committed transaction and
+        only then frees its cursor; freeing it first would let another
+        process place a new blob at the path this one is about to unlink.
+        A crash in between leaks the cursor, never a live blob's file.
+        """
+        if released is None:
+            return
+        for filepath in released.filepaths:
+            BlobStore.remove(filepath)
+        blob_cursors.release([released.cursor])
+
+    @staticmethod
+    def record_derivative(
+        blob: Blob,
+        variant: str,
+        size: int
+    ) -> None:
+        """Marks a derivative as just used, registering it if it is new."""
+        now = datetime.utcnow()
+        derivative = db.session.scalar(
+            sa.select(Derivative).where(Derivative.blob_id == blob.id, Derivative.variant == variant)
+        )
+        if derivative is not None:
+            # Recency only needs to be approximate; spare the write on hot derivatives
+            if now - derivative.last_access > timedelta(seconds=60):
+                derivative.last_access = now
+                db.session.commit()
+            return
+        db.session.add(Derivative(blob_id=blob.id, variant=variant, size=size, last_access=now))
+        try:
+            db.session.commit()
+        except sa.exc.IntegrityError:
+            db.session.rollback()
+            return
+        DBOps.evict_derivatives(current_app.config['DERIVATIVES_MAX_BYTES'])
+
+    @staticmethod
+    def evict_derivatives(max_bytes: int, batch_size: int = 100) -> int:
+        """Deletes least recently used derivatives until they fit in max_bytes."""
+        total = db.session.scalar(sa.select(sa.func.coalesce(sa.func.sum(Derivative.size), 0)))
+        evicted = 0
+        while total > max_bytes:
+            oldest = db.session.execute(
+                sa.select(Derivative, Blob).join(Blob).order_by(Derivative.last_access).limit(batch_size)
+            ).all()
+            if not oldest:
+                break
+            filepaths = []
+            for derivative, blob in oldest:
+                if total <= max_bytes:
+                    break
+                filepaths.append(blob.derivative_filepath(derivative.variant))
+                total -= derivative.size
+                db.session.delete(derivative)
+            db.session.commit()
+            for filepath in filepaths:
+                BlobStore.remove(filepath)
+            evicted += len(filepaths)
+        return evicted
+
+    @staticmethod
+    def create_upload_session(
+        author: User,
+        size: int | None = None,
+        image_type: ImageType | None = None
+    ) -> UploadSession:
+        DBOps.expire_upload_sessions()
+        upload = UploadSession(
+            size=size,
+            image_type=image_type,
+            user_id=author.id,
+            expiration=datetime.utcnow() + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+        )
+        db.session.add(upload)
         db.session.commit()
-        filepath = image.filepath()
-        image_content.save(filepath)
+        return upload
+
+    @staticmethod
+    def get_upload_session(
+        id: str,
+        author: User
+    ) -> UploadSession:
+        upload = db.session.get(UploadSession, id)
+        if upload is None or upload.user_id != author.id or upload.expiration < datetime.utcnow():
+            abort(404)
+        return upload
+
+    @staticmethod
+    def append_upload_chunk(
+        upload: UploadSession,
+        offset: int,
+        stream: BinaryIO
+    ) -> int:
+        max_size = current_app.config['MAX_IMAGE_SIZE']
+        if upload.size is not None:
+            max_size = min(max_size, upload.size)
+        try:
+            return PartialUploads.append(upload.filepath(), offset, stream, max_size)
+        finally:
+            upload.expiration = datetime.utcnow() + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+            db.session.commit()
+
+    @staticmethod
+    def finish_upload_session(
+        upload: UploadSession,
+        author: User
+    ) -> Image:
+        filepath = upload.filepath()
+        with open(filepath, 'rb') as source:
+            image = DBOps.create_image(source, upload.image_type, author)
+        DBOps.delete_upload_session(upload)
         return image
 
     @staticmethod
+    def delete_upload_session(upload: UploadSession) -> None:
+        filepath = upload.filepath()
+        db.session.delete(upload)
+        db.session.commit()
+        PartialUploads.remove(filepath)
+
+    @staticmethod
+    def expire_upload_sessions(batch_size: int = 100) -> int:
+        """Deletes up to batch_size expired sessions and their partial files."""
+        expired = db.session.scalars(
+            sa.select(UploadSession).where(UploadSession.expiration < datetime.utcnow()).limit(batch_size)
+        ).all()
+        filepaths = [upload.filepath() for upload in expired]
+        for upload in expired:
+            db.session.delete(upload)
+        db.session.commit()
+        for filepath in filepaths:
+            PartialUploads.remove(filepath)
+        return len(expired)
+
+    @staticmethod
+    def image_keyset(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        columns: Tuple = (Image,)
+    ) -> sa.Select:
+        """Author's images newest first, strictly after the (timestamp, id) position."""
+        query = sa.select(*columns).where(Image.user_id == author.id)
+        if after:
+            timestamp, identifier = after
+            query = query.where(sa.or_(
+                Image.timestamp < timestamp,
+                sa.and_(Image.timestamp == timestamp, Image.id < identifier)
+            ))
+        return query.order_by(Image.timestamp.desc(), Image.id.desc())
+
+    @staticmethod
+    @read_only
+    def page_image_rows(
+        author: User,
+        after: Tuple[datetime, int] | None = None,
+        limit: int = 100
+    ) -> List[sa.Row]:
+        query = DBOps.image_keyset(author, after, IMAGE_COLUMNS).limit(limit)
+        return db.session.execute(query).all()
+
+    @staticmethod
+    @read_only
     def look_for_image(
         label: str | None = None,
         author: User | None = None
@@ -137,7 +761,9 @@ class DBOps:
     @staticmethod
     def delete_image(id: int) -> None:
         row = Image.query.get_or_404(id)
-        filepath = row.filepath()
-        os.remove(filepath)
-        row.delete()
+        blob = row.blob
+        db.session.delete(row)
+        DBOps.count_resources(row.user_id, images=-1)
+        released = DBOps.release_blob(blob)
         db.session.commit()
+        DBOps.discard_blob_files(released)
@@ -0,0 +1,113 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+from pathlib import Path
+import tempfile
+from threading import RLock
+from typing import NamedTuple
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # Pillow is optional; without it no derivatives are rendered
+    PILImage = None
+
+# Query argument -> Pillow format name
+DERIVATIVE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+
+class Variant(NamedTuple):
+    width: int
+    format: str
+    quality: int
+
+    @property
+    def key(self) -> str:
+        return f"w{self.width}q{self.quality}.{self.format}"
+
+    @property
+    def mimetype(self) -> str:
+        return f"image/{self.format}"
+
+
+def render(source: str, target: str, variant: Variant) -> int:
+    """Runs in a pool process: writes the variant of source to target, returns its size."""
+    with PILImage.open(source) as picture:
+        # Bounded by width only; thumbnail keeps the aspect ratio and never upscales
+        picture.thumbnail((variant.width, variant.width * 64))
+        if variant.format == 'jpeg' and picture.mode not in ('RGB', 'L'):
+            picture = picture.convert('RGB')
+        descriptor, partial = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                picture.save(output, DERIVATIVE_FORMATS[variant.format], quality=variant.quality)
+            os.replace(partial, target)
+        except BaseException:
+            Path(partial).unlink(missing_ok=True)
+            raise
+    return os.path.getsize(target)
+
+
+class Renderer:
+    """Process pool that renders derivatives so resizing never runs in a request worker."""
+
+    def __init__(self, max_workers: int = 2) -> None:
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending: dict[str, Future] = {}
+        self._pid = os.getpid()
+        self._lock = RLock()
+
+    def configure(self, max_workers: int) -> None:
+        with self._lock:
+            self.max_workers = max(1, max_workers)
+
+    def submit(self, source: Path, target: Path, variant: Variant) -> Future:
+        """
+        Starts rendering target, or returns the future of a render already
+        under way. If a pool process died (killed for memory, a crashing
+        codec), the renders it had fail with BrokenProcessPool and the pool
+        is replaced, so later requests do not inherit the failure.
+        """
+        key = str(target)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Pools do not survive a fork; the child starts its own
+                self._executor = None
+                self._pending = {}
+                self._pid = os.getpid()
+            future = self._pending.get(key)
+            if future is None:
+                try:
+                    executor = self._pool()
+                    future = executor.submit(render, str(source), key, variant)
+                except BrokenProcessPool:
+                    self._discard(executor)
+                    executor = self._pool()
+                    future = executor.submit(render, str(source), key, variant)
+                self._pending[key] = future
+                future.add_done_callback(lambda done: self._forget(key, executor, done))
+            return future
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, key: str, executor: ProcessPoolExecutor, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard(executor)
+
+
+renderer = Renderer()
@@ -2,7 +2,12 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 
+from app.cache import TTLCache
+from app.replicas import RoutingSession
+
 # Initialize extensions, but don't configure them yet
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
+# (user id, user version, request key) -> serialized API response, per process
+response_cache = TTLCache()
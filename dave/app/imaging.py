@@ -0,0 +1,93 @@
+from pathlib import Path
+import struct
+from typing import BinaryIO, Tuple
+
+from app.models import ImageType
+
+# JPEG markers without a length field
+JPEG_STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+# Start-of-frame markers, which carry the image dimensions
+JPEG_FRAMES = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+
+
+def image_size(filepath: Path, image_type: ImageType) -> Tuple[int, int] | None:
+    """
+    Reads (width, height) from the image header without decoding pixels.
+
+    Returns:
+        The dimensions, or None if the header cannot be parsed.
+    """
+    with open(filepath, 'rb') as source:
+        if image_type is ImageType.PNG:
+            header = source.read(24)
+            if len(header) == 24 and header[12:16] == b'IHDR':
+                return struct.unpack('>II', header[16:24])
+        elif image_type is ImageType.GIF:
+            header = source.read(10)
+            if len(header) == 10:
+                return struct.unpack('<HH', header[6:10])
+        else:
+            for marker, segment in jpeg_segments(source):
+                if marker in JPEG_FRAMES and len(segment) >= 5:
+                    height, width = struct.unpack('>HH', segment[1:5])
+                    return width, height
+    return None
+
+
+def jpeg_segments(source: BinaryIO):
+    """Yields (marker, payload) for every JPEG header segment up to the scan data."""
+    if source.read(2) != b'\xff\xd8':
+        return
+    while True:
+        byte = source.read(1)
+        while byte == b'\xff':
+            byte = source.read(1)
+        if not byte:
+            return
+        marker = byte[0]
+        if marker in JPEG_STANDALONE:
+            yield marker, b''
+            continue
+        length = source.read(2)
+        if len(length) < 2:
+            return
+        payload = source.read(struct.unpack('>H', length)[0] - 2)
+        yield marker, payload
+        if marker == JPEG_SOS:
+            return
+
+
+def strip_jpeg_metadata(source: Path, target: Path) -> bool:
+    """
+    Copies a JPEG without its APP1 (EXIF and XMP) segments. The compressed
+    image data is copied byte for byte, so nothing is re-encoded.
+
+    Returns:
+        True if target was written, False if there was nothing to strip.
+    """
+    with open(source, 'rb') as original:
+        kept = []
+        stripped = False
+        for marker, payload in jpeg_segments(original):
+            if marker == JPEG_APP1:
+                stripped = True
+                continue
+            kept.append((marker, payload))
+            if marker == JPEG_SOS:
+                break
+        else:
+            return False
+        if not stripped:
+            return False
+        with open(target, 'wb') as output:
+            output.write(b'\xff\xd8')
+            for marker, payload in kept:
+                output.write(bytes((0xFF, marker)))
+                if marker not in JPEG_STANDALONE:
+                    output.write(struct.pack('>H', len(payload) + 2))
+                    output.write(payload)
+            while chunk := original.read(1 << 16):
+                output.write(chunk)
+    return True
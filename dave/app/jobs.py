@@ -0,0 +1,292 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import multiprocessing
+import os
+import pickle
+import socket
+import time
+import traceback
+from typing import Callable, Dict, List, NamedTuple
+
+from flask import Flask
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import Job, JobState
+
+# Job kind -> function called with the payload as keyword arguments
+job_handlers: Dict[str, Callable[..., None]] = {}
+
+
+def job_handler(kind: str) -> Callable:
+    """Registers the decorated function as the handler of kind."""
+    def register(function: Callable[..., None]) -> Callable[..., None]:
+        job_handlers[kind] = function
+        return function
+    return register
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """Persistent job queue kept in the application database."""
+
+    @staticmethod
+    def enqueue(
+        kind: str,
+        payload: dict | None = None,
+        delay: float = 0,
+        max_attempts: int = 5
+    ) -> Job:
+        """
+        Adds a job to the current session without committing, so the job is
+        only visible to workers if the caller's transaction commits.
+        """
+        job = Job(
+            kind=kind,
+            payload=payload or {},
+            max_attempts=max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        return job
+
+    @staticmethod
+    def enqueue_many(
+        kind: str,
+        payloads: List[dict],
+        max_attempts: int = 5
+    ) -> None:
+        """Like enqueue, for many jobs of one kind in a single INSERT."""
+        if not payloads:
+            return
+        now = datetime.utcnow()
+        db.session.execute(sa.insert(Job), [
+            {
+                'kind': kind,
+                'payload': payload,
+                'state': JobState.QUEUED,
+                'attempts': 0,
+                'max_attempts': max_attempts,
+                'run_at': now,
+                'timestamp': now
+            }
+            for payload in payloads
+        ])
+
+    @staticmethod
+    def claim(
+        worker: str,
+        count: int,
+        lease: float
+    ) -> List[ClaimedJob]:
+        """
+        Atomically marks up to count due jobs as running by worker. Jobs left
+        running longer than lease seconds belong to a worker that died and are
+        claimed again.
+        """
+        now = datetime.utcnow()
+        due = sa.or_(
+            sa.and_(Job.state == JobState.QUEUED, Job.run_at <= now),
+            sa.and_(Job.state == JobState.RUNNING, Job.locked_at < now - timedelta(seconds=lease))
+        )
+        rows = db.session.execute(
+            sa.update(Job)
+            .where(Job.id.in_(
+                sa.select(Job.id).where(due).order_by(Job.run_at).limit(count)
+            ))
+            .where(due)
+            .values(state=JobState.RUNNING, locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        ).all()
+        db.session.commit()
+        return [ClaimedJob(*row) for row in rows]
+
+    @staticmethod
+    def renew(worker: str, ids: List[int]) -> None:
+        """Extends the lease of running jobs, so long ones are not claimed twice."""
+        db.session.execute(
+            sa.update(Job)
+            .where(Job.id.in_(ids), Job.locked_by == worker)
+            .values(locked_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    @staticmethod
+    def complete(job: ClaimedJob) -> None:
+        db.session.execute(
+            sa.update(Job)
+            .where(Job.id == job.id)
+            .values(state=JobState.DONE, locked_by=None, locked_at=None, last_error=None)
+        )
+        db.session.commit()
+
+    @staticmethod
+    def fail(
+        job: ClaimedJob,
+        error: str,
+        backoff: float
+    ) -> JobState:
+        """Requeues the job after an exponential backoff, or fails it once out of attempts."""
+        values = {'locked_by': None, 'locked_at': None, 'last_error': error}
+        if job.attempts >= job.max_attempts:
+            values['state'] = JobState.FAILED
+        else:
+            values['state'] = JobState.QUEUED
+            values['run_at'] = datetime.utcnow() + timedelta(seconds=backoff * 2 ** (job.attempts - 1))
+        db.session.execute(sa.update(Job).where(Job.id == job.id).values(**values))
+        db.session.commit()
+        return values['state']
+
+    @staticmethod
+    def purge(older_than: float, batch_size: int = 1000) -> int:
+        """Deletes finished jobs older than older_than seconds."""
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        result = db.session.execute(
+            sa.delete(Job).where(Job.id.in_(
+                sa.select(Job.id)
+                .where(Job.state == JobState.DONE, Job.timestamp < cutoff)
+                .limit(batch_size)
+            ))
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+# Application of the current pool process, created by _initialize
+_app: Flask | None = None
+
+
+def _initialize(settings: dict) -> None:
+    global _app
+    from app import create_app, tasks
+    _app = create_app(type('WorkerConfig', (), settings))
+
+
+def _execute(kind: str, payload: dict) -> None:
+    """Runs in a pool process; an exception marks the job as failed."""
+    with _app.app_context():
+        try:
+            job_handlers[kind](**payload)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+
+
+class Worker:
+    """Claims due jobs and runs them on a process pool until stopped."""
+
+    def __init__(
+        self,
+        app: Flask,
+        processes: int,
+        poll_interval: float,
+        lease: float,
+        backoff: float,
+        retention: float
+    ) -> None:
+        self.app = app
+        self.processes = max(1, processes)
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.backoff = backoff
+        self.retention = retention
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = False
+
+    def settings(self) -> dict:
+        """Configuration for the pool processes; spawn needs it to be picklable."""
+        settings = {}
+        for key, value in self.app.config.items():
+            if not key.isupper():
+                continue
+            try:
+                pickle.dumps(value)
+            except Exception:
+                continue
+            settings[key] = value
+        return settings
+
+    def run(self, burst: bool = False) -> int:
+        """
+        Processes jobs until stop() is called, or until none are due if burst is set.
+
+        Returns:
+            The number of jobs that were run.
+        """
+        from app import tasks  # handlers register themselves on import
+        executed = 0
+        renewed = purged = time.monotonic()
+        pending: Dict[Future, ClaimedJob] = {}
+        executor = self._executor()
+        self.running = True
+        try:
+            with self.app.app_context():
+                while self.running or pending:
+                    free = self.processes - len(pending)
+                    if self.running and free > 0:
+                        for job in JobQueue.claim(self.name, free, self.lease):
+                            if job.kind not in job_handlers:
+                                JobQueue.fail(job, f"No handler for job kind '{job.kind}'", self.backoff)
+                                continue
+                            pending[executor.submit(_execute, job.kind, job.payload)] = job
+                    if not pending:
+                        if burst:
+                            break
+                        if time.monotonic() - purged > 3600:
+                            JobQueue.purge(self.retention)
+                            purged = time.monotonic()
+                        wait_until(lambda: not self.running, self.poll_interval)
+                        continue
+                    done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    if time.monotonic() - renewed > self.lease / 3:
+                        JobQueue.renew(self.name, [job.id for job in pending.values()])
+                        renewed = purged = time.monotonic()
+                    broken = False
+                    for future in done:
+                        job = pending.pop(future)
+                        executed += 1
+                        error = future.exception()
+                        if error is None:
+                            JobQueue.complete(job)
+                            continue
+                        broken = broken or isinstance(error, BrokenProcessPool)
+                        message = ''.join(traceback.format_exception(error))
+                        state = JobQueue.fail(job, message, self.backoff)
+                        self.app.logger.warning(
+                            f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, now {state}: {error!r}"
+                        )
+                    if broken:
+                        # A pool process died (e.g. killed for memory); every job on the pool failed with it
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        executor = self._executor()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return executed
+
+    def _executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_initialize,
+            initargs=(self.settings(),)
+        )
+
+    def stop(self) -> None:
+        """Lets the jobs under way finish, then makes run() return."""
+        self.running = False
+
+
+def wait_until(condition: Callable[[], bool], timeout: float, step: float = 0.1) -> None:
+    """Sleeps up to timeout seconds, waking early once condition holds."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(min(step, timeout))
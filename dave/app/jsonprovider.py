@@ -0,0 +1,60 @@
+from typing import Any
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; without it the standard library encoder is used
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Encodes with orjson, which serializes datetimes natively as ISO 8601
+    strings. Types orjson does not know (Decimal, objects with __html__)
+    fall back to the default provider's conversions.
+    """
+    name = 'orjson'
+
+    def _options(self, **kwargs: Any) -> int:
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self.dumpb(obj, **kwargs).decode()
+
+    def dumpb(self, obj: Any, **kwargs: Any) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self._options(**kwargs))
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        # Same as the default provider, without the round trip through str
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self._app.debug if self.compact is None else not self.compact
+        return self._app.response_class(
+            self.dumpb(obj, indent=indent) + b'\n',
+            mimetype=self.mimetype
+        )
+
+
+json_providers: dict[str, type[JSONProvider]] = {
+    'default': DefaultJSONProvider,
+    ORJSONProvider.name: ORJSONProvider,
+}
+
+
+def configure_json(app: Flask) -> None:
+    """Installs the provider named by JSON_PROVIDER; 'auto' picks orjson when installed."""
+    name = app.config['JSON_PROVIDER']
+    if name == 'auto':
+        name = ORJSONProvider.name if orjson is not None else 'default'
+    if name == ORJSONProvider.name and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    app.json = json_providers[name](app)
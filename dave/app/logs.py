@@ -0,0 +1,194 @@
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, RotatingFileHandler
+import os
+from pathlib import Path
+import queue
+import re
+from threading import Thread
+import uuid
+
+from flask import Flask, g, has_request_context, request, Response
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming request ids are reused when they look like one, so ids can follow a request across services
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+# Records written per batch at most
+BATCH_SIZE = 512
+
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Puts records on the pipeline's queue without ever waiting: when the
+    queue is full the record is dropped and counted. The message and the
+    traceback are rendered by the thread that logs, while the arguments
+    are unchanged and the request context with its id is still there.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.request_id = g.get('request_id') if has_request_context() else None
+        # Arguments and tracebacks may not be picklable nor safe to read from another thread
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.message,
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.threadName,
+            'location': f"{record.pathname}:{record.lineno}",
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LogPipeline:
+    """
+    The app logger's only file output: a RequestQueueHandler in front and a
+    listener thread that formats queued records as JSON lines and writes
+    them in batches, one write and one flush per batch, rotating the file
+    before a batch would take it past max_bytes.
+    """
+
+    def __init__(self) -> None:
+        self.handler: RequestQueueHandler | None = None
+        self.file_handler: RotatingFileHandler | None = None
+        self.formatter = JSONLinesFormatter()
+        self.max_bytes = 0
+        self._thread: Thread | None = None
+        self._sentinel = object()
+
+    def configure(self, path: Path, level: int, queue_size: int, max_bytes: int, backup_count: int) -> None:
+        # Another create_app in the same process (tests, benchmarks) replaces the previous pipeline
+        self.stop()
+        self.max_bytes = max_bytes
+        self.file_handler = RotatingFileHandler(path, backupCount=backup_count, encoding='utf-8')
+        self.handler = RequestQueueHandler(queue.Queue(queue_size))
+        self.handler.setLevel(level)
+        self.start()
+
+    def start(self) -> None:
+        self._thread = Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def restart_in_child(self) -> None:
+        # Only the forking thread survives a fork, and the queue may hold the parent's records
+        if self.handler is not None:
+            self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+            self.handler.dropped = 0
+            self.start()
+
+    def stop(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            # Blocks, since the last records must not be dropped; only happens at exit or reconfiguration
+            self.handler.queue.put(self._sentinel)
+            self._thread.join()
+        if self.file_handler is not None:
+            self.file_handler.close()
+        self._thread = None
+
+    def _run(self) -> None:
+        log_queue = self.handler.queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is self._sentinel
+            records = batch[:-1] if stopping else batch
+            if self.handler.dropped:
+                dropped, self.handler.dropped = self.handler.dropped, 0
+                message = f"Log queue full: dropped {dropped} records"
+                records.append(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': message, 'message': message,
+                }))
+            if records:
+                self.write(records)
+            if stopping:
+                return
+
+    def write(self, records: list) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record) + '\n')
+            except Exception:
+                self.handler.handleError(record)
+        data = ''.join(lines)
+        stream = self.file_handler.stream
+        try:
+            if self.max_bytes and stream.tell() and stream.tell() + len(data) > self.max_bytes:
+                self.file_handler.doRollover()
+                stream = self.file_handler.stream
+            stream.write(data)
+            stream.flush()
+        except Exception:
+            self.handler.handleError(records[0])
+
+
+log_pipeline = LogPipeline()
+
+
+def configure_logging(app: Flask, level: int) -> None:
+    """
+    Sends app.logger to LOGS_PATH/application.jsonl through log_pipeline
+    and nowhere else, and gives every request a correlation id: the client's X-Request-ID
+    when it sends a valid one, else a new one. The id is in each log line
+    of the request and in the X-Request-ID response header.
+    """
+    config = app.config
+    log_pipeline.configure(
+        Path(config['LOGS_PATH'], 'application.jsonl'),
+        level,
+        config['LOG_QUEUE_SIZE'],
+        config['LOG_MAX_BYTES'],
+        config['LOG_BACKUP_COUNT']
+    )
+    for handler in [handler for handler in app.logger.handlers if isinstance(handler, RequestQueueHandler)]:
+        app.logger.removeHandler(handler)
+    # Console handlers write synchronously, on the request thread
+    app.logger.removeHandler(default_handler)
+    app.logger.propagate = False
+    app.logger.addHandler(log_pipeline.handler)
+    app.logger.setLevel(level)
+
+    @app.before_request
+    def assign_request_id() -> None:
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+
+    @app.after_request
+    def return_request_id(response: Response) -> Response:
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+
+os.register_at_fork(after_in_child=log_pipeline.restart_in_child)
+atexit.register(log_pipeline.stop)
@@ -0,0 +1,176 @@
+from bisect import bisect_left
+from threading import Lock
+import time
+from typing import Any, Dict, List, Tuple
+
+from flask import Flask, g, has_request_context, request, Response
+import sqlalchemy as sa
+
+from app.extensions import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def exposition(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def exposition(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Request latency, SQL and image I/O metrics of this process, in the
+    Prometheus text format. Under a multi-process server every worker
+    keeps its own, so scrape each worker or aggregate them upstream.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.request_duration = Histogram(
+            'dave_request_duration_seconds', "Request latency by endpoint.", ('endpoint', 'method', 'status')
+        )
+        self.sql_queries = Counter(
+            'dave_sql_queries_total', "SQL statements executed, by endpoint of the request.", ('endpoint',)
+        )
+        self.sql_seconds = Counter(
+            'dave_sql_query_seconds_total', "Time spent in SQL statements, by endpoint of the request.", ('endpoint',)
+        )
+        self.image_io_bytes = Counter(
+            'dave_image_io_bytes_total', "Image bytes written (uploads, renditions) and served.", ('direction',)
+        )
+        self.token_cache_lookups = Counter(
+            'dave_token_cache_lookups_total', "Bearer token verifications by token cache result.", ('result',)
+        )
+
+    def count_image_io(self, direction: str, size: int) -> None:
+        if self.enabled:
+            self.image_io_bytes.inc((direction,), size)
+
+    def count_token_lookup(self, result: str) -> None:
+        if self.enabled:
+            self.token_cache_lookups.inc((result,))
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in (
+            self.request_duration, self.sql_queries, self.sql_seconds, self.image_io_bytes, self.token_cache_lookups
+        ):
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def current_endpoint() -> str:
+    # Statements outside requests come from the CLI and the job worker
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+def before_cursor_execute(connection: sa.Connection, *args: Any) -> None:
+    connection.info['query_started'] = time.perf_counter()
+
+
+def after_cursor_execute(connection: sa.Connection, *args: Any) -> None:
+    elapsed = time.perf_counter() - connection.info.pop('query_started')
+    endpoint = current_endpoint()
+    metrics.sql_queries.inc((endpoint,))
+    metrics.sql_seconds.inc((endpoint,), elapsed)
+
+
+def configure_metrics(app: Flask) -> None:
+    """With METRICS_ENABLED, instruments requests and the app's engines and serves GET /metrics."""
+    metrics.enabled = app.config['METRICS_ENABLED']
+    if not metrics.enabled:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics.request_duration.observe(
+                time.perf_counter() - started,
+                (request.endpoint or 'unmatched', request.method, str(response.status_code))
+            )
+        return response
+
+    def metrics_endpoint() -> Response:
+        return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
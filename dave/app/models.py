@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import enum
 from pathlib import Path
 import secrets
@@ -8,9 +8,12 @@ import sqlalchemy as sa
 import sqlalchemy.orm as so
 
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, url_for
 from flask_login import UserMixin
 
+from app.compression import CompressedText
 from app.extensions import db, login_manager
+from app.stamps import user_stamps
 from app.tools import get_identifiers_from_number
 
 
@@ -20,12 +23,31 @@ class ResourceType(enum.StrEnum):
     IMAGE = 'image'
 
 
+class JobState(enum.StrEnum):
+    QUEUED  = 'queued'
+    RUNNING = 'running'
+    DONE    = 'done'
+    FAILED  = 'failed'
+
+
 class ImageType(enum.StrEnum):
     PNG  = '.png'
     JPG  = '.jpg'
     JPEG = '.jpeg'
     GIF  = '.gif'
 
+    @property
+    def mimetype(self) -> str:
+        return IMAGE_MIMETYPES[self]
+
+
+IMAGE_MIMETYPES = {
+    ImageType.PNG: 'image/png',
+    ImageType.JPG: 'image/jpeg',
+    ImageType.JPEG: 'image/jpeg',
+    ImageType.GIF: 'image/gif',
+}
+
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
@@ -35,6 +57,12 @@ class User(UserMixin, db.Model):
     password_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256)) # Increased length for stronger hashes
     token: so.Mapped[Optional[str]] = so.mapped_column(sa.String(32), index=True, unique=True)
     token_expiration: so.Mapped[Optional[datetime]]
+    # Kept in step by DBOps in the same transaction as each create and delete
+    text_htmls_counter: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    images_counter: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    # Bumped with every change to the user or their resources; validates cached API responses
+    version: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    last_modified: so.Mapped[Optional[datetime]] = so.mapped_column(default=datetime.utcnow)
 
     # Relationship to resources created by the user
     text_htmls: so.WriteOnlyMapped['TextHTML'] = so.relationship(back_populates='author', lazy='dynamic')
@@ -47,10 +75,10 @@ class User(UserMixin, db.Model):
         return url_for('api.user', id=self.id)
 
     def text_htmls_url(self) -> str:
-        return url_for('api.text_htmls', id=self.id),
+        return url_for('api.get_resources')
 
     def images_url(self) -> str:
-        return url_for('api.images', id=self.id),
+        return url_for('api.list_images')
 
     def set_password(self, password: str) -> None:
         """Hashes the password and stores it."""
@@ -61,10 +89,10 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def text_htmls_count(self) -> int:
-        return 0
+        return self.text_htmls_counter
 
     def images_count(self) -> int:
-        return 0
+        return self.images_counter
 
     def to_dict(self) -> dict[str, str]:
         data = {
@@ -97,6 +125,12 @@ class User(UserMixin, db.Model):
 
 
 
+@sa.event.listens_for(User, 'after_update')
+@sa.event.listens_for(User, 'after_delete')
+def stamp_user(mapper: so.Mapper, connection: sa.Connection, user: User) -> None:
+    user_stamps.changed(so.object_session(user), user.id)
+
+
 @login_manager.user_loader
 def load_user(id: int) -> User:
     return db.session.get(User, int(id))
@@ -104,9 +138,16 @@ def load_user(id: int) -> User:
 
 class TextHTML(db.Model):
     """Text HTML content"""
+    # Keyset pagination walks (user_id, timestamp, id) in index order
+    __table_args__ = (
+        sa.Index('ix_text_html_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     label: so.Mapped[str] = so.mapped_column(sa.String(32), index=True, unique=True)
-    content: so.Mapped[str] = so.mapped_column(sa.Text, nullable=True)
+    # Compressed at rest; see app.compression. The database cannot search compressed values, so
+    # DBOps indexes the plaintext for app.search; without an index a search decompresses rows in Python
+    content: so.Mapped[str] = so.mapped_column(CompressedText, nullable=True)
 
     user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), index=True)
     author: so.Mapped['User'] = so.relationship(back_populates='text_htmls')
@@ -114,7 +155,7 @@ class TextHTML(db.Model):
     timestamp: so.Mapped[datetime] = so.mapped_column(index=True, default=datetime.utcnow)
 
     def __repr__(self) -> str:
-        return f'<TextHTML({self.id}, {self.timestamp}, {self.author.username}, {self.label})>'
+        return f'<TextHTML({self.id}, {self.timestamp}, {self.user_id}, {self.label})>'
 
     def url(self) -> str:
         return f"{str(ResourceType.TEXT_HTML)}/{self.label}"
@@ -130,7 +171,7 @@ class TextHTML(db.Model):
             'mimetype': self.mimetype(),
             'links': {
                 'self': self.url(),
-                'author': self.author.url()
+                'author': url_for('api.user', id=self.user_id)
             }
         }
         return data
@@ -138,30 +179,111 @@ class TextHTML(db.Model):
 
 
 
+class CursorSequence(db.Model):
+    """Next never-issued cursor of a 24-bit cursor space."""
+    name: so.Mapped[str] = so.mapped_column(sa.String(32), primary_key=True)
+    next_value: so.Mapped[int]
+
+
+class FreeCursor(db.Model):
+    """Cursor released by a delete, to be issued again before the sequence advances."""
+    name: so.Mapped[str] = so.mapped_column(sa.String(32), primary_key=True)
+    cursor: so.Mapped[int] = so.mapped_column(primary_key=True)
+
+
+class Blob(db.Model):
+    """Image bytes stored once per SHA-256 digest, shared by every Image with that content."""
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    sha256: so.Mapped[str] = so.mapped_column(sa.String(64), index=True, unique=True)
+    cursor: so.Mapped[int] = so.mapped_column(index=True, unique=True)
+    image_type: so.Mapped[ImageType]
+    size: so.Mapped[int]
+    refcount: so.Mapped[int] = so.mapped_column(default=0)
+    # Filled in by the image.postprocess job
+    width: so.Mapped[Optional[int]]
+    height: so.Mapped[Optional[int]]
+
+    timestamp: so.Mapped[datetime] = so.mapped_column(default=datetime.utcnow)
+
+    images: so.WriteOnlyMapped['Image'] = so.relationship(back_populates='blob', passive_deletes=True)
+
+    def filepath(self) -> Path:
+        first_identifier, second_identifier, third_identifier = get_identifiers_from_number(self.cursor)
+        name = f"{first_identifier}{second_identifier}{third_identifier}"
+        return Path(current_app.config["UPLOADS_FOLDER"], first_identifier, second_identifier, name).with_suffix(str(self.image_type))
+
+    def derivative_filepath(self, variant: str) -> Path:
+        """Cached rendition of this blob, stored beside it in the same shard directory."""
+        filepath = self.filepath()
+        return filepath.with_name(f"{filepath.stem}.{variant}")
+
+    def __repr__(self) -> str:
+        return f'<Blob({self.id}, {self.sha256}, {self.cursor}, {self.refcount})>'
+
+
+class Derivative(db.Model):
+    """Resized or re-encoded rendition of a blob, evicted least recently used first."""
+    __table_args__ = (
+        sa.UniqueConstraint('blob_id', 'variant'),
+    )
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    blob_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Blob.id), index=True)
+    variant: so.Mapped[str] = so.mapped_column(sa.String(32))
+    size: so.Mapped[int]
+    last_access: so.Mapped[datetime] = so.mapped_column(index=True, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f'<Derivative({self.id}, {self.blob_id}, {self.variant}, {self.size})>'
+
+
+class UploadSession(db.Model):
+    """Resumable image upload whose bytes accumulate in a partial file until finished."""
+    id: so.Mapped[str] = so.mapped_column(sa.String(32), primary_key=True, default=lambda: secrets.token_hex(16))
+    size: so.Mapped[Optional[int]]
+    image_type: so.Mapped[Optional[ImageType]]
+
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), index=True)
+
+    timestamp: so.Mapped[datetime] = so.mapped_column(default=datetime.utcnow)
+    expiration: so.Mapped[datetime] = so.mapped_column(index=True)
+
+    def filepath(self) -> Path:
+        return Path(current_app.config["PARTIALS_FOLDER"], self.id).with_suffix('.part')
+
+    def __repr__(self) -> str:
+        return f'<UploadSession({self.id}, {self.user_id}, {self.size}, {self.expiration})>'
+
+
 class Image(db.Model):
+    # Keyset pagination walks (user_id, timestamp, id) in index order
+    __table_args__ = (
+        sa.Index('ix_image_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     label: so.Mapped[str] = so.mapped_column(sa.String(32), index=True, unique=True)
-    count: so.Mapped[int]
     image_type: so.Mapped[ImageType]
 
+    blob_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Blob.id), index=True)
+    blob: so.Mapped['Blob'] = so.relationship(back_populates='images')
+
     user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id), index=True)
     author: so.Mapped['User'] = so.relationship(back_populates='images')
 
     timestamp: so.Mapped[datetime] = so.mapped_column(index=True, default=datetime.utcnow)
 
     def filepath(self) -> Path:
-        first_identifier, second_identifier, third_identifier = get_identifiers_from_number(self.cursor)
-        name = f"{first_identifier}{second_identifier}{third_identifier}"
-        return Path(app.config["IMAGES_FOLDER"], first_identifier, second_identifier, name).with_suffix(str(self.image_type))
+        return self.blob.filepath()
 
     def __repr__(self) -> str:
-        return f'<Image({self.id}, {self.timestamp}, {self.author.username}, {self.label}, {self.cursor}, {str(self.image_type)})>'
+        return f'<Image({self.id}, {self.timestamp}, {self.user_id}, {self.label}, {self.blob_id}, {str(self.image_type)})>'
 
     def url(self) -> str:
         return f"{str(ResourceType.IMAGE)}/{self.label}"
 
     def mimetype(self) -> str:
-        return "mimetype"
+        return self.image_type.mimetype
 
     def to_dict(self) -> dict[str, str]:
         data = {
@@ -171,7 +293,31 @@ class Image(db.Model):
             'mimetype': self.mimetype(),
             'links': {
                 'self': self.url(),
-                'author': self.author.url()
+                'author': url_for('api.user', id=self.user_id)
             }
         }
         return data
+
+
+class Job(db.Model):
+    """Unit of background work, claimed and run by `flask worker` processes."""
+    # Workers poll for due jobs in (state, run_at) order
+    __table_args__ = (
+        sa.Index('ix_job_state_run_at', 'state', 'run_at'),
+    )
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    kind: so.Mapped[str] = so.mapped_column(sa.String(64))
+    payload: so.Mapped[dict] = so.mapped_column(sa.JSON, default=dict)
+    state: so.Mapped[JobState] = so.mapped_column(default=JobState.QUEUED)
+    attempts: so.Mapped[int] = so.mapped_column(default=0)
+    max_attempts: so.Mapped[int] = so.mapped_column(default=5)
+    run_at: so.Mapped[datetime] = so.mapped_column(default=datetime.utcnow)
+    locked_by: so.Mapped[Optional[str]] = so.mapped_column(sa.String(64))
+    locked_at: so.Mapped[Optional[datetime]]
+    last_error: so.Mapped[Optional[str]] = so.mapped_column(sa.Text)
+
+    timestamp: so.Mapped[datetime] = so.mapped_column(default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f'<Job({self.id}, {self.kind}, {str(self.state)}, {self.attempts}/{self.max_attempts})>'
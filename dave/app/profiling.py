@@ -0,0 +1,249 @@
+from collections import Counter
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import random
+import sys
+from threading import Event, get_ident, Lock, Thread
+import time
+from types import FrameType
+from typing import Any, Dict, Iterator, List, Tuple
+
+from flask import Flask, g, has_request_context, request
+import sqlalchemy as sa
+
+from app.extensions import db
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Frames of these modules time and report statements, they never issue them
+PROFILING_FILES = {os.path.abspath(__file__), os.path.join(APP_ROOT, 'metrics.py')}
+
+# How each backend shows the plan of a statement without running it
+explain_prefixes = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+    'mariadb': 'EXPLAIN ',
+}
+# Only these get a plan; EXPLAIN of DDL and PRAGMAs tells nothing or fails
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+# Backends where a failed statement aborts the transaction, so the EXPLAIN runs in this savepoint
+# (SQLite could not open one while the logged statement's rows are still being read)
+savepoint_dialects = {'postgresql'}
+EXPLAIN_SAVEPOINT = 'dave_explain'
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def issuing_frame(frame: FrameType | None) -> Tuple[str, int]:
+    """The innermost app function on the stack, e.g. a DBOps method, and its current line."""
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_ROOT) and filename not in PROFILING_FILES:
+            return frame_label(frame), frame.f_lineno
+        frame = frame.f_back
+    return 'unknown', 0
+
+
+class SlowQueryLog:
+    """
+    Appends the statements that take longer than PROFILE_SLOW_QUERY_MS to
+    slow_queries.jsonl in LOGS_PATH, one JSON object per line, with the
+    app function that issued them and, with PROFILE_EXPLAIN, their plan.
+    Parameters are left out since they can hold user data.
+    """
+
+    def __init__(self) -> None:
+        self.threshold = 0.0
+        self.explain = False
+        self.path: Path | None = None
+        self._lock = Lock()
+
+    def configure(self, threshold_ms: float, explain: bool, logs_path: str) -> None:
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.path = Path(logs_path, 'slow_queries.jsonl')
+
+    def before_cursor_execute(self, connection: sa.Connection, *args: Any) -> None:
+        connection.info['profile_started'] = time.perf_counter()
+
+    def after_cursor_execute(
+        self,
+        connection: sa.Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool
+    ) -> None:
+        elapsed = time.perf_counter() - connection.info.pop('profile_started')
+        if elapsed < self.threshold:
+            return
+        caller, line = issuing_frame(sys._getframe(1))
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'caller': caller,
+            'line': line,
+            'endpoint': (request.endpoint or 'unmatched') if has_request_context() else 'background',
+            'statement': ' '.join(statement.split()),
+            'executemany': executemany,
+        }
+        if self.explain and not executemany:
+            record['plan'] = self.plan(connection, statement, parameters)
+        with self._lock, open(self.path, 'a') as log:
+            log.write(json.dumps(record) + '\n')
+
+    @staticmethod
+    def plan(connection: sa.Connection, statement: str, parameters: Any) -> List[str] | None:
+        prefix = explain_prefixes.get(connection.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return None
+        # A cursor of its own on the DBAPI connection, so the statement's results stay untouched
+        # and no events fire for the EXPLAIN. Where a failure would abort the request's
+        # transaction, it runs in a savepoint
+        savepoint = connection.dialect.name in savepoint_dialects and connection.in_transaction()
+        cursor = connection.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            except Exception as error:
+                if savepoint:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+                return [f"EXPLAIN failed: {error}"]
+            finally:
+                if savepoint:
+                    cursor.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        finally:
+            cursor.close()
+
+
+slow_query_log = SlowQueryLog()
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads serving profiled requests every
+    interval from one background thread, and writes each request's samples
+    to LOGS_PATH/profiles in the folded format that flamegraph.pl,
+    speedscope and inferno read: one 'outer;...;inner count' line per stack.
+    """
+
+    def __init__(self) -> None:
+        self.rate = 0.0
+        self.interval = 0.005
+        self.path: Path | None = None
+        # thread id -> samples of the request that thread is serving
+        self._samples: Dict[int, Counter] = {}
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread: Thread | None = None
+
+    def configure(self, rate: float, interval: float, logs_path: str) -> None:
+        self.rate = rate
+        self.interval = interval
+        self.path = Path(logs_path, 'profiles')
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def start(self) -> None:
+        with self._lock:
+            self._samples[get_ident()] = Counter()
+            # The sampler sleeps while no request is profiled; after a fork it has to be started again
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self) -> Counter:
+        with self._lock:
+            return self._samples.pop(get_ident(), Counter())
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._samples:
+                    self._wakeup.clear()
+                    continue
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self.fold(frame)] += 1
+
+    @staticmethod
+    def fold(frame: FrameType | None) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def write(self, samples: Counter, endpoint: str) -> Path:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        path = Path(self.path, f"{stamp}-{os.getpid()}-{endpoint}.folded")
+        with open(path, 'w') as target:
+            for stack, count in samples.most_common():
+                target.write(f"{stack} {count}\n")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def read_slow_queries(path: Path) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    with open(path) as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_folded(path: Path) -> Iterator[Tuple[List[str], int]]:
+    for profile in sorted(path.glob('*.folded')):
+        with open(profile) as folded:
+            for line in folded:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    yield stack.split(';'), int(count)
+
+
+def configure_profiling(app: Flask) -> None:
+    """
+    Opt-in profiling: PROFILE_SLOW_QUERY_MS logs slow statements of the
+    app's engines, PROFILE_SAMPLE_RATE samples that share of requests.
+    Nothing is installed while both are 0.
+    """
+    config = app.config
+    if config['PROFILE_SLOW_QUERY_MS'] > 0:
+        slow_query_log.configure(config['PROFILE_SLOW_QUERY_MS'], config['PROFILE_EXPLAIN'], config['LOGS_PATH'])
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            sa.event.listen(engine, 'before_cursor_execute', slow_query_log.before_cursor_execute)
+            sa.event.listen(engine, 'after_cursor_execute', slow_query_log.after_cursor_execute)
+
+    if config['PROFILE_SAMPLE_RATE'] > 0:
+        profiler.configure(config['PROFILE_SAMPLE_RATE'], config['PROFILE_SAMPLE_INTERVAL'], config['LOGS_PATH'])
+
+        @app.before_request
+        def start_profiling() -> None:
+            if random.random() < profiler.rate:
+                g.profiled = True
+                profiler.start()
+
+        @app.teardown_request
+        def stop_profiling(error: BaseException | None) -> None:
+            if g.pop('profiled', False):
+                samples = profiler.stop()
+                if samples:
+                    profiler.write(samples, request.endpoint or 'unmatched')
@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import inspect
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from flask import Flask, current_app, g, has_request_context, request, Response
+from flask_sqlalchemy.session import Session
+import sqlalchemy as sa
+
+# Reads are only sent to a replica inside a @read_only DBOps method
+_replica_reads: ContextVar[bool] = ContextVar('replica_reads', default=False)
+# ...and never inside primary_reads(), whatever the method
+_primary_reads: ContextVar[bool] = ContextVar('primary_reads', default=False)
+
+# Set on the responses of requests that wrote, so the client's next requests
+# read from the primary too, in whichever worker process they land
+PIN_COOKIE = 'dave_primary'
+
+
+def replica_bind_keys(config: Dict[str, Any]) -> List[str]:
+    return [f'replica{number}' for number in range(len(config['REPLICA_DATABASE_URIS']))]
+
+
+def replica_binds(config: Dict[str, Any]) -> Dict[str, Any]:
+    """SQLALCHEMY_BINDS with one bind per REPLICA_DATABASE_URIS entry added."""
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    binds.update(zip(replica_bind_keys(config), config['REPLICA_DATABASE_URIS']))
+    return binds
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Sends the reads of @read_only methods to the primary too, e.g. when a replica is known to lag."""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+def replica_allowed(session: 'RoutingSession') -> bool:
+    """Whether reads that may go to a replica can, given primary_reads() and the session's pin."""
+    return not _primary_reads.get() and not session.pinned()
+
+
+def read_only(function: Callable) -> Callable:
+    """
+    Marks a DBOps method that only reads, so its SELECTs may go to a replica.
+    Generators are marked one step at a time, so the caller's own queries
+    between two items are not.
+    """
+    if inspect.isgeneratorfunction(function):
+        @wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            generator = function(*args, **kwargs)
+            while True:
+                with replica_reads():
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                yield item
+        return generator_wrapper
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """
+    Sends SELECTs issued by @read_only DBOps methods to a replica, picked
+    once per session, and everything else to the primary. Once the session
+    has written, and for REPLICA_READ_YOUR_WRITES seconds after its commit,
+    all of its reads go to the primary, since replicas may lag behind.
+    """
+
+    def get_bind(
+        self,
+        mapper: Any | None = None,
+        clause: Any | None = None,
+        bind: Any | None = None,
+        **kwargs: Any
+    ) -> sa.Engine | sa.Connection:
+        if bind is None and _replica_reads.get() and not self._flushing and \
+                getattr(clause, 'is_select', False) and replica_allowed(self):
+            replica = self.replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def replica(self) -> sa.Engine | None:
+        if 'replica' not in self.info:
+            keys = replica_bind_keys(current_app.config)
+            self.info['replica'] = self._db.engines[random.choice(keys)] if keys else None
+        return self.info['replica']
+
+    def pinned(self) -> bool:
+        if self.info.get('wrote') or self.info.get('primary_until', 0) > time.monotonic():
+            return True
+        return has_request_context() and PIN_COOKIE in request.cookies
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def remember_flush(session: RoutingSession, flush_context: Any) -> None:
+    session.info['wrote'] = True
+
+
+@sa.event.listens_for(RoutingSession, 'do_orm_execute')
+def remember_bulk_write(orm_execute_state: sa.orm.ORMExecuteState) -> None:
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def start_window(session: RoutingSession) -> None:
+    if session.info.pop('wrote', False):
+        session.info['primary_until'] = time.monotonic() + current_app.config['REPLICA_READ_YOUR_WRITES']
+        if has_request_context():
+            g.replica_pin = True
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def forget_writes(session: RoutingSession) -> None:
+    session.info.pop('wrote', None)
+
+
+def configure_replicas(app: Flask) -> None:
+    if not app.config['REPLICA_DATABASE_URIS']:
+        return
+
+    @app.after_request
+    def pin_to_primary(response: Response) -> Response:
+        if g.get('replica_pin'):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=app.config['REPLICA_READ_YOUR_WRITES'],
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
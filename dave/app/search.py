@@ -0,0 +1,326 @@
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+from flask import current_app
+import sqlalchemy as sa
+
+from app.compression import CompressedText
+from app.extensions import db
+from app.models import TextHTML
+
+# (id, plaintext content) of the documents to add to or remove from an index
+Documents = Iterable[Tuple[int, str | None]]
+
+
+class SearchHit(NamedTuple):
+    id: int
+    label: str
+    timestamp: datetime
+    rank: float
+    snippet: str
+
+
+class SearchResults(NamedTuple):
+    hits: List[SearchHit]
+    # The backend gave up before looking at every document, so there may be more matches
+    truncated: bool = False
+
+
+class SearchBackend:
+    """
+    Interface for full-text search over TextHTML.content. Content is
+    compressed at rest, so indexes cannot be kept up to date by the
+    database itself: DBOps hands every written and deleted document to
+    index() and unindex() in the same transaction. Rows written outside
+    DBOps are found again after `flask search rebuild`.
+    """
+    name = 'base'
+    snippet_width = 64
+
+    def search(
+        self,
+        query: str,
+        author_id: int | None = None,
+        limit: int = 20
+    ) -> SearchResults:
+        """Best matches first; lower rank is better."""
+        raise NotImplementedError
+
+    def matches(
+        self,
+        query: str,
+        author_id: int | None = None
+    ) -> Iterator[int]:
+        """Ids of every match, best first, read lazily so consumers can stop early."""
+        raise NotImplementedError
+
+    def index(self, documents: Documents) -> None:
+        """Adds new documents to the index."""
+
+    def unindex(self, documents: Documents) -> None:
+        """Removes documents, given with the content they were indexed with."""
+
+    def install(self) -> None:
+        """Creates whatever index structures the backend needs."""
+
+    def rebuild(self) -> None:
+        """Re-indexes every TextHTML row from scratch."""
+
+    def snippet(self, content: str, query: str) -> str:
+        start = content.lower().find(query.lower())
+        if start < 0:
+            return content[:self.snippet_width]
+        end = start + len(query)
+        before = content[max(0, start - self.snippet_width // 2):start]
+        after = content[end:end + self.snippet_width // 2]
+        return f"{before}<mark>{content[start:end]}</mark>{after}"
+
+
+class LikeSearchBackend(SearchBackend):
+    """
+    Substring scan, for databases without a full-text index. The database
+    cannot filter compressed content, so rows are fetched newest first in
+    batches and decompressed in Python. search() stops after limit hits or
+    SEARCH_LIKE_MAX_ROWS rows, and then says the results are truncated;
+    matches() scans until its consumer stops.
+    """
+    name = 'like'
+    batch_size = 500
+
+    def rows(self, author_id: int | None) -> sa.Select:
+        statement = sa.select(TextHTML.id, TextHTML.label, TextHTML.timestamp, TextHTML.content) \
+            .order_by(TextHTML.timestamp.desc(), TextHTML.id.desc()) \
+            .execution_options(yield_per=self.batch_size)
+        if author_id is not None:
+            statement = statement.where(TextHTML.user_id == author_id)
+        return statement
+
+    def search(
+        self,
+        query: str,
+        author_id: int | None = None,
+        limit: int = 20
+    ) -> SearchResults:
+        if limit < 1:
+            raise ValueError("Searches without a full-text index need a positive limit")
+        max_rows = current_app.config['SEARCH_LIKE_MAX_ROWS']
+        needle = query.lower()
+        hits = []
+        # Closing the result when the search ends stops the fetch of further batches
+        with db.session.execute(self.rows(author_id).limit(max_rows + 1)) as rows:
+            for scanned, row in enumerate(rows):
+                if scanned == max_rows:
+                    return SearchResults(hits, truncated=True)
+                if row.content is not None and needle in row.content.lower():
+                    hits.append(SearchHit(row.id, row.label, row.timestamp, 0.0, self.snippet(row.content, query)))
+                    if len(hits) >= limit:
+                        break
+        return SearchResults(hits)
+
+    def matches(
+        self,
+        query: str,
+        author_id: int | None = None
+    ) -> Iterator[int]:
+        needle = query.lower()
+        with db.session.execute(self.rows(author_id)) as rows:
+            for row in rows:
+                if row.content is not None and needle in row.content.lower():
+                    yield row.id
+
+
+class FTS5SearchBackend(SearchBackend):
+    """
+    SQLite FTS5 external-content index. Stored content is compressed, so
+    the index reads plaintext through the text_html_plain view and the
+    dave_inflate function (app.compression), which only the app's
+    connections have. For that reason text_html has no triggers: DBOps
+    writes the index, and other sqlite3 connections can still change rows.
+    """
+    name = 'fts5'
+    table = 'text_html_fts'
+    schema = [
+        "CREATE VIEW IF NOT EXISTS text_html_plain AS "
+        "SELECT id, dave_inflate(content) AS content FROM text_html",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS text_html_fts USING fts5("
+        "content, content='text_html_plain', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    ]
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        """Quotes every term so user input is never parsed as FTS5 syntax."""
+        terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+        return " ".join(terms)
+
+    def search(
+        self,
+        query: str,
+        author_id: int | None = None,
+        limit: int = 20
+    ) -> SearchResults:
+        expression = self.match_expression(query)
+        if not expression:
+            return SearchResults([])
+        sql = (
+            "SELECT t.id, t.label, t.timestamp, f.rank, "
+            "snippet(text_html_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet "
+            "FROM text_html_fts AS f JOIN text_html AS t ON t.id = f.rowid "
+            "WHERE text_html_fts MATCH :expression"
+        )
+        params = {'expression': expression, 'limit': limit}
+        if author_id is not None:
+            sql += " AND t.user_id = :author_id"
+            params['author_id'] = author_id
+        sql += " ORDER BY f.rank LIMIT :limit"
+        statement = sa.text(sql).columns(timestamp=sa.DateTime)
+        return SearchResults([SearchHit(*row) for row in db.session.execute(statement, params)])
+
+    def matches(
+        self,
+        query: str,
+        author_id: int | None = None
+    ) -> Iterator[int]:
+        expression = self.match_expression(query)
+        if not expression:
+            return
+        sql = "SELECT f.rowid FROM text_html_fts AS f"
+        params = {'expression': expression}
+        if author_id is not None:
+            sql += " JOIN text_html AS t ON t.id = f.rowid WHERE text_html_fts MATCH :expression AND t.user_id = :author_id"
+            params['author_id'] = author_id
+        else:
+            sql += " WHERE text_html_fts MATCH :expression"
+        statement = sa.text(sql + " ORDER BY f.rank").execution_options(yield_per=500)
+        with db.session.execute(statement, params) as rows:
+            for row in rows:
+                yield row[0]
+
+    def index(self, documents: Documents) -> None:
+        values = [{'id': id, 'content': content} for id, content in documents if content is not None]
+        if values:
+            db.session.execute(sa.text("INSERT INTO text_html_fts(rowid, content) VALUES (:id, :content)"), values)
+
+    def unindex(self, documents: Documents) -> None:
+        # External-content tables need the indexed text to remove its terms
+        values = [{'id': id, 'content': content} for id, content in documents if content is not None]
+        if values:
+            db.session.execute(sa.text(
+                "INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', :id, :content)"
+            ), values)
+
+    def install(self) -> None:
+        for statement in self.schema:
+            db.session.execute(sa.text(statement))
+        db.session.commit()
+
+    def rebuild(self) -> None:
+        db.session.execute(sa.text("INSERT INTO text_html_fts(text_html_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    PostgreSQL full-text search on text_html.search_vector, a tsvector
+    column with a GIN index that DBOps fills from the plaintext when it
+    writes a row. The column holds terms only, so content stays compressed;
+    snippets are cut in Python from the few rows returned.
+    """
+    name = 'postgres'
+    column = 'search_vector'
+    # 'simple' neither stems nor drops stop words, so any word of a document can be searched
+    configuration = 'simple'
+    batch_size = 500
+
+    def query_sql(self, columns: str, author_id: int | None) -> str:
+        sql = (
+            f"SELECT {columns} FROM text_html AS t, plainto_tsquery('{self.configuration}', :query) AS q "
+            "WHERE t.search_vector @@ q"
+        )
+        if author_id is not None:
+            sql += " AND t.user_id = :author_id"
+        return sql + " ORDER BY rank, t.id DESC"
+
+    def search(
+        self,
+        query: str,
+        author_id: int | None = None,
+        limit: int = 20
+    ) -> SearchResults:
+        sql = self.query_sql(
+            "t.id, t.label, t.timestamp, -ts_rank(t.search_vector, q) AS rank, t.content", author_id
+        ) + " LIMIT :limit"
+        statement = sa.text(sql).columns(timestamp=sa.DateTime, content=CompressedText)
+        rows = db.session.execute(statement, {'query': query, 'author_id': author_id, 'limit': limit})
+        return SearchResults([
+            SearchHit(row.id, row.label, row.timestamp, row.rank, self.snippet(row.content or '', query))
+            for row in rows
+        ])
+
+    def matches(
+        self,
+        query: str,
+        author_id: int | None = None
+    ) -> Iterator[int]:
+        sql = self.query_sql("t.id, -ts_rank(t.search_vector, q) AS rank", author_id)
+        statement = sa.text(sql).execution_options(yield_per=self.batch_size)
+        with db.session.execute(statement, {'query': query, 'author_id': author_id}) as rows:
+            for row in rows:
+                yield row.id
+
+    def index(self, documents: Documents) -> None:
+        values = [{'id': id, 'content': content} for id, content in documents if content is not None]
+        if values:
+            db.session.execute(sa.text(
+                f"UPDATE text_html SET search_vector = to_tsvector('{self.configuration}', :content) WHERE id = :id"
+            ), values)
+
+    def install(self) -> None:
+        db.session.execute(sa.text(f"ALTER TABLE text_html ADD COLUMN IF NOT EXISTS {self.column} tsvector"))
+        db.session.execute(sa.text(
+            f"CREATE INDEX IF NOT EXISTS ix_text_html_{self.column} ON text_html USING gin ({self.column})"
+        ))
+        db.session.commit()
+
+    def rebuild(self) -> None:
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                sa.select(TextHTML.id, TextHTML.content)
+                .where(TextHTML.id > last_id).order_by(TextHTML.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            self.index(rows)
+            db.session.commit()
+
+
+search_backends: dict[str, type[SearchBackend]] = {
+    LikeSearchBackend.name: LikeSearchBackend,
+    FTS5SearchBackend.name: FTS5SearchBackend,
+    PostgresSearchBackend.name: PostgresSearchBackend,
+}
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Backend named by SEARCH_BACKEND; 'auto' picks FTS5 on SQLite when its
+    table exists, the tsvector column on PostgreSQL when it exists, and
+    the LIKE scan otherwise.
+    """
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        name = current_app.config['SEARCH_BACKEND']
+        if name == 'auto':
+            engine = db.engine
+            inspector = sa.inspect(engine)
+            name = LikeSearchBackend.name
+            if engine.dialect.name == 'sqlite' and inspector.has_table(FTS5SearchBackend.table):
+                name = FTS5SearchBackend.name
+            elif engine.dialect.name == 'postgresql' and PostgresSearchBackend.column in {
+                column['name'] for column in inspector.get_columns('text_html')
+            }:
+                name = PostgresSearchBackend.name
+        backend = search_backends[name]()
+        current_app.extensions['search'] = backend
+    return backend
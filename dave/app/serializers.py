@@ -0,0 +1,78 @@
+from typing import Any, Dict, Iterable, List
+
+from flask import url_for
+import sqlalchemy as sa
+
+from app.models import Image, ResourceType, TextHTML, User
+
+# Everything a listed resource needs, read as plain tuples without hydrating
+# ORM objects or loading authors. The serializers below only use attribute
+# access, so they accept model instances as well as these rows.
+TEXT_HTML_COLUMNS = (TextHTML.id, TextHTML.label, TextHTML.timestamp, TextHTML.user_id)
+IMAGE_COLUMNS = (Image.id, Image.label, Image.timestamp, Image.image_type, Image.user_id)
+USER_COLUMNS = (User.id, User.username, User.email, User.text_htmls_counter, User.images_counter)
+
+TEXT_HTML_PREFIX = f"{str(ResourceType.TEXT_HTML)}/"
+IMAGE_PREFIX = f"{str(ResourceType.IMAGE)}/"
+
+
+class AuthorURLs(dict):
+    """Author links built once per user for a whole listing."""
+
+    def __missing__(self, user_id: int) -> str:
+        url = self[user_id] = url_for('api.user', id=user_id)
+        return url
+
+
+def text_html_row_to_dict(row: Any, author_urls: AuthorURLs) -> Dict:
+    """Same shape as TextHTML.to_dict, from a TEXT_HTML_COLUMNS row."""
+    return {
+        'id': str(row.id),
+        'label': row.label,
+        'timestamp': str(row.timestamp),
+        'mimetype': "mimetype",
+        'links': {
+            'self': TEXT_HTML_PREFIX + row.label,
+            'author': author_urls[row.user_id]
+        }
+    }
+
+
+def image_row_to_dict(row: Any, author_urls: AuthorURLs) -> Dict:
+    """Same shape as Image.to_dict, from an IMAGE_COLUMNS row."""
+    return {
+        'id': str(row.id),
+        'label': row.label,
+        'timestamp': str(row.timestamp),
+        'mimetype': row.image_type.mimetype,
+        'links': {
+            'self': IMAGE_PREFIX + row.label,
+            'author': author_urls[row.user_id]
+        }
+    }
+
+
+def user_row_to_dict(row: Any) -> Dict:
+    """Same shape as User.to_dict, from a USER_COLUMNS row."""
+    return {
+        'id': str(row.id),
+        'username': row.username,
+        'email': row.email,
+        'text_htmls_count': str(row.text_htmls_counter),
+        'images_count': str(row.images_counter),
+        'links': {
+            'self': url_for('api.user', id=row.id),
+            'text_htmls': url_for('api.get_resources'),
+            'images': url_for('api.list_images')
+        }
+    }
+
+
+def text_html_rows_to_dicts(rows: Iterable[sa.Row]) -> List[Dict]:
+    author_urls = AuthorURLs()
+    return [text_html_row_to_dict(row, author_urls) for row in rows]
+
+
+def image_rows_to_dicts(rows: Iterable[sa.Row]) -> List[Dict]:
+    author_urls = AuthorURLs()
+    return [image_row_to_dict(row, author_urls) for row in rows]
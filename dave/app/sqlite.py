@@ -0,0 +1,76 @@
+import os
+from typing import Any, Dict
+
+from flask import Flask
+import sqlalchemy as sa
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.extensions import db
+
+
+def sqlite_pragmas(config: Dict[str, Any]) -> Dict[str, str]:
+    """PRAGMAs run on every new connection for SQLITE_PROFILE."""
+    profile = config['SQLITE_PROFILE']
+    if profile == 'default':
+        return {}
+    if profile != 'production':
+        raise RuntimeError(f"SQLITE_PROFILE must be 'default' or 'production', not {profile!r}")
+    return {
+        # Readers no longer block the writer nor the writer readers
+        'journal_mode': 'WAL',
+        # In WAL mode a crash can only lose the last commits, never corrupt the file
+        'synchronous': 'NORMAL',
+        'mmap_size': str(config['SQLITE_MMAP_SIZE']),
+        'cache_size': str(-config['SQLITE_CACHE_SIZE']), # negative: KiB rather than pages
+        'busy_timeout': str(config['SQLITE_BUSY_TIMEOUT']),
+        'temp_store': 'MEMORY',
+    }
+
+
+def sqlite_engine_options(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for SQLITE_PROFILE='production' on a database
+    file: a small pool per worker process, since SQLite serializes writers
+    anyway and each extra connection only costs page cache. Options set in
+    SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if config['SQLITE_PROFILE'] != 'production' or url.get_backend_name() != 'sqlite' or \
+            url.database in (None, '', ':memory:'):
+        return options
+    options.setdefault('poolclass', QueuePool)
+    options.setdefault('pool_size', config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', config['SQLITE_POOL_OVERFLOW'])
+    # Waiting on a busy database happens in SQLite (busy_timeout); the pool wait only covers checkouts
+    options.setdefault('pool_timeout', config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    return options
+
+
+def configure_sqlite(app: Flask) -> None:
+    """
+    Applies the SQLITE_PROFILE pragmas to the app's SQLite engines, and
+    makes forked worker processes (gunicorn --preload) open their own
+    connections instead of sharing the parent's.
+    """
+    pragmas = sqlite_pragmas(app.config)
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+    for engine in engines:
+        sa.event.listen(engine, 'connect', pragma_setter(pragmas))
+        # close=False leaves the parent's connections alone; the child just forgets them
+        os.register_at_fork(after_in_child=lambda engine=engine: engine.dispose(close=False))
+
+
+def pragma_setter(pragmas: Dict[str, str]):
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+    return set_pragmas
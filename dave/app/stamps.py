@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+from typing import Any, Tuple
+
+import sqlalchemy as sa
+
+from app.replicas import RoutingSession
+
+# A stamp file is emptied once it reaches this size; its mtime keeps the stamps distinct
+STAMP_MAX_BYTES = 4096
+
+
+class UserStamps:
+    """
+    One small file per user under USER_STAMPS_PATH, appended to whenever a
+    change of the user's row is written. Its (size, mtime) is a stamp that
+    every worker process sharing the directory reads with one stat(), so
+    what a process cached about a user is known stale in all of them as
+    soon as the row changes. Stamps are bumped once when the change is
+    written and again after its commit: a process that read the old row in
+    between still ends up with a stamp older than the committed change.
+    """
+
+    def __init__(self) -> None:
+        self.path: Path | None = None
+
+    def configure(self, path: str) -> None:
+        self.path = Path(path)
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def current(self, user_id: int) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.path / str(user_id))
+        except FileNotFoundError:
+            return 0, 0
+        return stat.st_size, stat.st_mtime_ns
+
+    def bump(self, user_id: int) -> None:
+        with open(self.path / str(user_id), 'ab') as stamp:
+            if stamp.tell() >= STAMP_MAX_BYTES:
+                stamp.truncate(0)
+            stamp.write(b'.')
+
+    def changed(self, session: Any, user_id: int) -> None:
+        """Records a change of the user's row written in session; bumps the stamp now and after the commit."""
+        if self.path is None or session is None:
+            return
+        self.bump(user_id)
+        session.info.setdefault('changed_users', set()).add(user_id)
+
+
+user_stamps = UserStamps()
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def bump_committed(session: RoutingSession) -> None:
+    for user_id in session.info.pop('changed_users', ()):
+        user_stamps.bump(user_id)
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def forget_changes(session: RoutingSession) -> None:
+    # The first bump only made cached entries miss once
+    session.info.pop('changed_users', None)
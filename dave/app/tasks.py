@@ -0,0 +1,30 @@
+from flask import current_app
+
+from app.dbops import DBOps
+from app.derivatives import PILImage, Variant, render
+from app.extensions import db
+from app.imaging import image_size
+from app.jobs import job_handler
+from app.models import Blob
+
+
+@job_handler('image.postprocess')
+def postprocess_image(blob_id: int) -> None:
+    """Records the dimensions and pre-renders the common thumbnails."""
+    blob = db.session.get(Blob, blob_id)
+    if blob is None:
+        # Every image using it was deleted before the job ran
+        return
+    if blob.width is None:
+        dimensions = image_size(blob.filepath(), blob.image_type)
+        if dimensions is not None:
+            blob.width, blob.height = dimensions
+            db.session.commit()
+    if PILImage is not None:
+        for width in current_app.config['DERIVATIVE_PREWARM_WIDTHS']:
+            variant = Variant(width, 'webp', 80)
+            target = blob.derivative_filepath(variant.key)
+            if not target.exists():
+                size = render(str(blob.filepath()), str(target), variant)
+                DBOps.record_derivative(blob, variant.key, size)
+
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from app.cache import TTLCache
+from app.extensions import db
+from app.metrics import metrics
+from app.models import User
+from app.stamps import user_stamps
+
+
+class TokenCache:
+    """
+    Bearer token -> snapshot of its user's row, so verify_token answers
+    repeated calls without a query. An entry is used only while the
+    user's stamp (app.stamps) is the one it was taken at: a new or revoked
+    token, a profile change or new resources bump it, in every worker.
+    """
+
+    def __init__(self) -> None:
+        self.entries = TTLCache()
+        self.columns = [column.key for column in sa.inspect(User).column_attrs]
+
+    def configure(self, maxsize: int, ttl: float) -> None:
+        self.entries.configure(maxsize, ttl)
+
+    def get(self, token: str) -> User | None:
+        """The token's user, attached to the session without a SELECT, or None on a miss."""
+        if not self.entries.maxsize:
+            return None
+        entry = self.entries.get(token)
+        if entry is not None:
+            stamp, values = entry
+            expiration = values['token_expiration'].replace(tzinfo=timezone.utc)
+            if user_stamps.current(values['id']) == stamp and expiration >= datetime.now(timezone.utc):
+                metrics.count_token_lookup('hit')
+                user = User(**values)
+                so.make_transient_to_detached(user)
+                return db.session.merge(user, load=False)
+            self.entries.pop(token)
+        metrics.count_token_lookup('miss')
+        return None
+
+    def set(self, token: str, user: User) -> None:
+        if self.entries.maxsize:
+            values: Dict[str, Any] = {key: getattr(user, key) for key in self.columns}
+            self.entries.set(token, (user_stamps.current(user.id), values))
+
+
+token_cache = TokenCache()
@@ -1,11 +1,29 @@
 # your_project_name/app/tools.py
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime
+import logging
 from random import choices, randrange
-from typing import Tuple
+from string import ascii_uppercase
+from typing import List, Tuple
+
+
+class LoggedException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        logging.error(message)
 
 
 def generate_random_label(string_length: int = 32) -> str:
-    return "".join(random.choices(string.ascii_uppercase, k=string_length))
+    return "".join(choices(ascii_uppercase, k=string_length))
+
+
+def generate_random_labels(count: int, string_length: int = 32) -> List[str]:
+    """count distinct labels, drawn in a single call to choices."""
+    letters = "".join(choices(ascii_uppercase, k=count * string_length))
+    labels = {letters[start:start + string_length] for start in range(0, len(letters), string_length)}
+    while len(labels) < count:
+        labels.add(generate_random_label(string_length))
+    return list(labels)
 
 
 def base_256(number: int) -> Tuple[int, int, int]:
@@ -59,3 +77,37 @@ def get_identifiers_from_number(number: int) -> Tuple[str, str, str]:
     return (f"{first_identifier:03d}", f"{second_identifier:03d}", f"{third_identifier:03d}")
 
 
+def encode_page_cursor(timestamp: datetime, identifier: int) -> str:
+    """
+    Encodes a (timestamp, id) keyset position as an opaque, URL-safe string.
+
+    Args:
+        timestamp: The timestamp of the last row in the page.
+        identifier: The id of the last row in the page.
+
+    Returns:
+        A base64 string without padding, suitable for a query argument.
+    """
+    raw = f"{timestamp.isoformat()}|{identifier}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodes a string produced by encode_page_cursor.
+
+    Args:
+        cursor: The opaque cursor received from a client.
+
+    Returns:
+        The (timestamp, id) keyset position.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, identifier = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(identifier)
+    except (UnicodeDecodeError, ValueError, TypeError) as error:
+        raise ValueError(f"Invalid page cursor {cursor!r}") from error
@@ -0,0 +1,68 @@
+import fcntl
+import os
+from pathlib import Path
+from typing import BinaryIO
+
+from app.blobstore import BlobStore, ImageTooLarge
+
+
+class OffsetMismatch(ValueError):
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadBusy(ValueError):
+    pass
+
+
+class PartialUploads:
+    """File operations for resumable uploads; the partial file's size is the offset."""
+
+    @staticmethod
+    def offset(filepath: Path) -> int:
+        try:
+            return filepath.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def append(
+        filepath: Path,
+        offset: int,
+        stream: BinaryIO,
+        max_size: int
+    ) -> int:
+        """
+        Appends the stream at offset, which must be the current end of the file.
+        Whatever arrives before a dropped connection is kept, so the client can
+        resume from the new offset.
+
+        Raises:
+            OffsetMismatch: If offset is not where the upload currently ends.
+            UploadBusy: If another request is appending to the same upload.
+            ImageTooLarge: If the upload would grow past max_size bytes.
+        """
+        descriptor = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        with os.fdopen(descriptor, 'ab') as target:
+            try:
+                fcntl.flock(target.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy("Another request is writing to this upload")
+            current = os.fstat(target.fileno()).st_size
+            if offset != current:
+                raise OffsetMismatch(current)
+            try:
+                while chunk := stream.read(BlobStore.chunk_size):
+                    current += len(chunk)
+                    if current > max_size:
+                        raise ImageTooLarge(f"Upload larger than {max_size} bytes")
+                    target.write(chunk)
+            finally:
+                target.flush()
+                os.fsync(target.fileno())
+            return current
+
+    @staticmethod
+    def remove(filepath: Path) -> None:
+        filepath.unlink(missing_ok=True)
@@ -0,0 +1,280 @@
+# dave/benchmarks/api_suite.py
+"""
+Load test of the API, reproducible across commits. Starts the app on a
+temporary SQLite store, seeds users with TextHTMLs and images from a fixed
+random seed, and serves it with a threaded WSGI server on localhost. Each
+scenario then runs with concurrent keep-alive clients for a fixed time
+and reports throughput and p50/p95/p99 latency; --output writes the
+report as JSON and --compare prints the change against an earlier one.
+
+    python -m benchmarks.api_suite --users 10 --text-htmls 1000 --images 50 --clients 16 \\
+        --seconds 10 --output bench-$(git rev-parse --short HEAD).json --compare bench-main.json
+
+Scenarios: token (POST /api/tokens), list-text-htmls, search, list-images,
+upload (POST /api/image_set), delete (DELETE /api/image_set/<label>, on
+seeded images, so it ends early once they are gone) and mixed.
+"""
+import argparse
+import base64
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import http.client
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlencode
+
+import sqlalchemy as sa
+from werkzeug.serving import make_server
+
+from app.dbops import DBOps
+from app.extensions import db
+from app.models import TextHTML, User
+from app.search import get_search_backend
+from benchmarks.common import make_app
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00'
+WORDS = (
+    'amber', 'basalt', 'cobalt', 'delta', 'ember', 'fjord', 'granite', 'harbor', 'indigo', 'juniper',
+    'kelp', 'lagoon', 'meadow', 'nectar', 'obsidian', 'prairie', 'quartz', 'river', 'saffron', 'tundra',
+)
+PASSWORD = 'benchmark'
+# Share of the requests of the mixed scenario
+MIX = (('list-text-htmls', 0.4), ('search', 0.2), ('list-images', 0.3), ('upload', 0.1))
+
+
+class Account:
+    """A seeded user with what its clients send: basic credentials, a bearer token, a session cookie."""
+
+    def __init__(self, username: str, basic: str, token: str, cookie: str, labels: deque) -> None:
+        self.username = username
+        self.basic = {'Authorization': f'Basic {basic}'}
+        self.bearer = {'Authorization': f'Bearer {token}'}
+        self.cookie = {'Cookie': cookie}
+        # Seeded images the delete scenario may remove
+        self.labels = labels
+
+
+def document(rng: random.Random, number: int) -> str:
+    words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 200)))
+    return f'<article><h1>Document {number}</h1><p>{words}</p></article>'
+
+
+def seed(users: int, text_htmls: int, images: int, rng: random.Random) -> Dict[str, List[str]]:
+    """Users, their TextHTMLs (bulk inserted) and images (through DBOps); returns image labels per username."""
+    labels = {}
+    start = datetime.now(timezone.utc)
+    for number in range(users):
+        user = User(username=f'bench{number}', email=f'bench{number}@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        db.session.execute(sa.insert(TextHTML), [
+            {
+                'label': f'b{number}t{row}',
+                'content': document(rng, row),
+                'user_id': user.id,
+                'timestamp': start - timedelta(seconds=row)
+            }
+            for row in range(text_htmls)
+        ])
+        DBOps.count_resources(user.id, text_htmls=text_htmls)
+        db.session.commit()
+        labels[user.username] = [
+            DBOps.create_image(io.BytesIO(PNG_HEADER + rng.randbytes(512)), None, user).label
+            for _ in range(images)
+        ]
+    # The bulk inserts bypass DBOps, which keeps the search index
+    get_search_backend().rebuild()
+    return labels
+
+
+def sign_in(port: int, username: str, labels: List[str]) -> Account:
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    basic = base64.b64encode(f'{username}:{PASSWORD}'.encode()).decode()
+    connection.request('POST', '/api/tokens', headers={'Authorization': f'Basic {basic}'})
+    token = json.loads(connection.getresponse().read())['token']
+    # The TextHTML listing and search take a login session rather than a token
+    form = urlencode({'username': username, 'password': PASSWORD})
+    connection.request('POST', '/auth/login', body=form,
+                       headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    cookie = '; '.join(header.split(';', 1)[0] for header in response.headers.get_all('Set-Cookie') or ())
+    connection.close()
+    return Account(username, basic, token, cookie, deque(labels))
+
+
+def request_for(scenario: str, account: Account, rng: random.Random) -> tuple | None:
+    """(method, path, body, headers) of one request of the scenario, or None when there is nothing left to do."""
+    if scenario == 'mixed':
+        scenario = rng.choices([name for name, _ in MIX], [share for _, share in MIX])[0]
+    if scenario == 'token':
+        return 'POST', '/api/tokens', None, account.basic
+    if scenario == 'list-text-htmls':
+        return 'GET', '/api/text_html_set?limit=50', None, account.cookie
+    if scenario == 'search':
+        return 'GET', f'/api/text_html_set/search?q={rng.choice(WORDS)}&limit=20', None, account.cookie
+    if scenario == 'list-images':
+        return 'GET', '/api/image_set?limit=50', None, account.bearer
+    if scenario == 'upload':
+        # Distinct bytes, so every upload stores a new blob
+        return 'POST', '/api/image_set', PNG_HEADER + rng.randbytes(512), \
+            {**account.bearer, 'Content-Type': 'image/png'}
+    if scenario == 'delete':
+        try:
+            label = account.labels.popleft()
+        except IndexError:
+            return None
+        return 'DELETE', f'/api/image_set/{label}', None, account.bearer
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+def client(
+    port: int,
+    scenario: str,
+    account: Account,
+    rng: random.Random,
+    deadline: float,
+    latencies: List[float],
+    statuses: Dict[int, int],
+    lock: threading.Lock
+) -> None:
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    own_latencies, own_statuses = [], {}
+    while time.perf_counter() < deadline:
+        request = request_for(scenario, account, rng)
+        if request is None:
+            break
+        method, path, body, headers = request
+        started = time.perf_counter()
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        own_latencies.append(time.perf_counter() - started)
+        own_statuses[response.status] = own_statuses.get(response.status, 0) + 1
+    connection.close()
+    with lock:
+        latencies.extend(own_latencies)
+        for status, count in own_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+
+def run_scenario(port: int, scenario: str, accounts: List[Account], arguments: argparse.Namespace) -> dict:
+    latencies, statuses, lock = [], {}, threading.Lock()
+    started = time.perf_counter()
+    deadline = started + arguments.seconds
+    clients = [
+        threading.Thread(target=client, args=(
+            port, scenario, accounts[number % len(accounts)], random.Random(f'{arguments.seed}-{scenario}-{number}'),
+            deadline, latencies, statuses, lock
+        ))
+        for number in range(arguments.clients)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    result = {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        result.update({
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(percentiles[49] * 1000, 3),
+            'p95_ms': round(percentiles[94] * 1000, 3),
+            'p99_ms': round(percentiles[98] * 1000, 3),
+            'max_ms': round(max(latencies) * 1000, 3),
+        })
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def change(current: float | None, baseline: float | None) -> str:
+    if not current or not baseline:
+        return ''
+    return f"{(current - baseline) / baseline:+.1%}"
+
+
+def main() -> None:
+    scenarios = ('token', 'list-text-htmls', 'search', 'list-images', 'upload', 'mixed', 'delete')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--text-htmls', type=int, default=1000, help='TextHTMLs per user')
+    parser.add_argument('--images', type=int, default=50, help='images per user')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients, spread over the users')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each scenario')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios, default=list(scenarios))
+    parser.add_argument('--seed', type=int, default=0, help='seeds the data and every client')
+    parser.add_argument('--output', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='an earlier report to compare throughput and p95 with')
+    arguments = parser.parse_args()
+
+    app = make_app(LOGGING_LEVEL='ERROR', WTF_CSRF_ENABLED=False, METRICS_ENABLED=False)
+    seeding = time.perf_counter()
+    with app.app_context():
+        labels = seed(arguments.users, arguments.text_htmls, arguments.images, random.Random(arguments.seed))
+    print(f"Seeded {arguments.users} users with {arguments.text_htmls} TextHTMLs and {arguments.images} images "
+          f"each in {time.perf_counter() - seeding:.1f}s")
+
+    # The access log of the development server would cost every request a console write
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    accounts = [sign_in(server.port, username, user_labels) for username, user_labels in labels.items()]
+
+    baseline = {}
+    if arguments.compare:
+        with open(arguments.compare) as report:
+            baseline = json.load(report)['scenarios']
+    print(f"{arguments.clients} clients, {arguments.seconds:.0f}s per scenario")
+    print(f"{'scenario':<18}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+          + (f"{'req/s Δ':>10}{'p95 Δ':>10}" if baseline else ''))
+    results = {}
+    # Deletes last, so the other scenarios see every seeded image
+    for scenario in sorted(arguments.scenarios, key=lambda name: name == 'delete'):
+        result = results[scenario] = run_scenario(server.port, scenario, accounts, arguments)
+        line = f"{scenario:<18}{result['requests']:>10}{result['throughput']:>10.1f}" \
+            f"{result.get('p50_ms', 0):>10.1f}{result.get('p95_ms', 0):>10.1f}{result.get('p99_ms', 0):>10.1f}" \
+            f"{result['errors']:>8}"
+        if scenario in baseline:
+            line += f"{change(result['throughput'], baseline[scenario]['throughput']):>10}" \
+                f"{change(result.get('p95_ms'), baseline[scenario].get('p95_ms')):>10}"
+        print(line)
+    server.shutdown()
+
+    if arguments.output:
+        report = {
+            'commit': git_commit(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': vars(arguments),
+            'scenarios': results,
+        }
+        with open(arguments.output, 'w') as target:
+            json.dump(report, target, indent=2)
+        print(f"Wrote {arguments.output}")
+
+
+if __name__ == '__main__':
+    main()
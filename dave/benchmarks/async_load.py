@@ -0,0 +1,101 @@
+# dave/benchmarks/async_load.py
+"""
+Requests per second of the API in sync mode and with API_ASYNC, served by
+a threaded WSGI server on localhost. Concurrent clients list images and
+upload new ones on keep-alive connections. Async mode needs flask[async],
+sqlalchemy[asyncio] and aiosqlite.
+
+    python -m benchmarks.async_load --clients 16 --seconds 10 --upload-ratio 0.2
+"""
+import argparse
+import base64
+import http.client
+import io
+import os
+import random
+import statistics
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from app.extensions import db
+from app.models import User
+from benchmarks.common import make_app
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00'
+
+
+def client(port: int, headers: dict, deadline: float, upload_ratio: float, latencies: list, errors: list) -> None:
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if random.random() < upload_ratio:
+            # Distinct bytes, so every upload stores a new blob
+            connection.request('POST', '/api/image_set', body=PNG_HEADER + os.urandom(256),
+                               headers={**headers, 'Content-Type': 'image/png'})
+        else:
+            connection.request('GET', '/api/image_set?limit=50', headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status >= 400:
+            errors.append(response.status)
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def run(api_async: bool, arguments: argparse.Namespace) -> dict:
+    app = make_app(API_ASYNC=api_async, LOGGING_LEVEL='ERROR')
+    with app.app_context():
+        user = User(username='load', email='load@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+    basic = base64.b64encode(b'load:secret').decode()
+    token = app.test_client().post('/api/tokens', headers={'Authorization': f'Basic {basic}'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + arguments.seconds
+    clients = [
+        threading.Thread(target=client, args=(server.port, headers, deadline, arguments.upload_ratio, latencies, errors))
+        for _ in range(arguments.clients)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    server.shutdown()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / arguments.seconds,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'errors': len(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--upload-ratio', type=float, default=0.2, help='share of requests that upload an image')
+    arguments = parser.parse_args()
+
+    print(f"{arguments.clients} clients for {arguments.seconds:.0f}s, {arguments.upload_ratio:.0%} uploads")
+    print(f"{'mode':<8}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for mode, api_async in (('sync', False), ('async', True)):
+        try:
+            result = run(api_async, arguments)
+        except RuntimeError as error:
+            print(f"{mode:<8}skipped: {error}")
+            continue
+        print(f"{mode:<8}{result['requests']:>10}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+              f"{result['p95']:>10.1f}{result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
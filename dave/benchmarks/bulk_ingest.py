@@ -0,0 +1,71 @@
+# dave/benchmarks/bulk_ingest.py
+"""
+Compares TextHTML ingestion throughput: DBOps.create_text_html, with one
+commit per document, against POST /api/text_html_set/batch with a JSON
+array and with NDJSON.
+
+    python -m benchmarks.bulk_ingest --documents 2000 --chunk 500
+"""
+import argparse
+import base64
+import json
+import time
+
+from app.dbops import DBOps
+from app.extensions import db
+from app.models import User
+from benchmarks.common import make_app
+
+
+def document(number: int) -> str:
+    return f"<p>Document {number}: " + "lorem ipsum dolor sit amet " * 20 + "</p>"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--chunk', type=int, default=500, help='TEXT_HTML_BATCH_CHUNK')
+    arguments = parser.parse_args()
+
+    app = make_app(TEXT_HTML_BATCH_CHUNK=arguments.chunk)
+    with app.app_context():
+        user = User(username='bot', email='bot@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    basic = base64.b64encode(b'bot:secret').decode()
+    token = client.post('/api/tokens', headers={'Authorization': f'Basic {basic}'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    documents = [document(number) for number in range(arguments.documents)]
+
+    with app.app_context():
+        author = db.session.get(User, 1)
+        start = time.perf_counter()
+        for content in documents:
+            DBOps.create_text_html(content, author)
+        single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/api/text_html_set/batch', json=[{'content': content} for content in documents], headers=headers)
+    array = time.perf_counter() - start
+    assert response.get_json()['_meta']['created'] == arguments.documents
+
+    body = ''.join(json.dumps({'content': content}) + '\n' for content in documents)
+    start = time.perf_counter()
+    response = client.post(
+        '/api/text_html_set/batch',
+        data=body,
+        headers={**headers, 'Content-Type': 'application/x-ndjson'}
+    )
+    ndjson = time.perf_counter() - start
+    assert response.get_json()['_meta']['created'] == arguments.documents
+
+    print(f"{arguments.documents} documents, chunks of {arguments.chunk}")
+    print(f"{'path':<24}{'seconds':>10}{'docs/s':>12}{'speedup':>10}")
+    for name, elapsed in (('one commit per doc', single), ('batch, JSON array', array), ('batch, NDJSON', ndjson)):
+        print(f"{name:<24}{elapsed:>10.3f}{arguments.documents / elapsed:>12.0f}{single / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# dave/benchmarks/common.py
+"""
+Helpers shared by the benchmark and stress scripts in this package.
+Run the scripts from the dave/ directory, e.g. python -m benchmarks.cursor_stress
+"""
+from pathlib import Path
+import tempfile
+
+from flask import Flask
+import flask_migrate
+
+from app import create_app
+from config import Config
+from storage import Storage
+
+MIGRATIONS = str(Path(__file__).resolve().parents[1] / 'migrations')
+
+
+def make_config(root: Path, **overrides) -> type[Config]:
+    """Config pointing every store at root, with overrides applied on top."""
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(Path(root, 'app.db'))
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+        STORE_PATH = str(root)
+        UPLOADS_FOLDER = str(Storage.container(root, 'images'))
+        LOGS_PATH = str(Storage.container(root, 'logs'))
+        USER_STAMPS_PATH = str(Storage.container(root, 'user_stamps'))
+        LOGGING_LEVEL = 'WARN'
+
+    for key, value in overrides.items():
+        setattr(BenchmarkConfig, key, value)
+    return BenchmarkConfig
+
+
+def make_app(root: Path | None = None, **overrides) -> Flask:
+    """App on a fresh, fully migrated store under root (a temporary directory by default)."""
+    root = Path(root or tempfile.mkdtemp(prefix='dave-bench-'))
+    app = create_app(make_config(root, **overrides))
+    with app.app_context():
+        flask_migrate.upgrade(directory=MIGRATIONS)
+    return app
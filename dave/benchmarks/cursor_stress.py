@@ -0,0 +1,100 @@
+# dave/benchmarks/cursor_stress.py
+"""
+Stress test for blob cursor allocation: many processes upload distinct images
+at once, and some delete theirs so freed cursors get issued again. Fails if
+two live blobs ever share a cursor or a blob file is missing or corrupted.
+
+With the defaults every cursor is reserved on its own and every other
+image is deleted, so freed cursors are issued again while their previous
+blob's files are still being removed.
+
+    python -m benchmarks.cursor_stress --processes 8 --uploads 100
+"""
+import argparse
+from hashlib import sha256
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+
+from app.dbops import DBOps
+from app.extensions import db
+from app.models import Blob, ImageType, User
+from benchmarks.common import make_app
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+def uploader(app, user_id: int, uploads: int, delete_every: int, results) -> None:
+    with app.app_context():
+        # Connections must not be shared with the parent process
+        db.engine.dispose(close=False)
+        author = db.session.get(User, user_id)
+        cursors = []
+        for number in range(uploads):
+            content = PNG_MAGIC + os.urandom(64)
+            image = DBOps.create_image(io.BytesIO(content), ImageType.PNG, author)
+            cursors.append(image.blob.cursor)
+            if delete_every and number % delete_every == delete_every - 1:
+                DBOps.delete_image(image.id)
+        results.put(cursors)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--uploads', type=int, default=100, help="uploads per process")
+    parser.add_argument('--delete-every', type=int, default=2, help="delete every n-th upload, 0 to never delete")
+    parser.add_argument('--block-size', type=int, default=1, help="cursors reserved at once; larger blocks delay reuse")
+    args = parser.parse_args()
+
+    app = make_app(CURSOR_BLOCK_SIZE=args.block_size)
+    with app.app_context():
+        user = User(username='stress', email='stress@example.com')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [
+        context.Process(target=uploader, args=(app, user_id, args.uploads, args.delete_every, results))
+        for _ in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    issued = [cursor for _ in workers for cursor in results.get()]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    failures = []
+    if any(worker.exitcode != 0 for worker in workers):
+        failures.append("an uploader process failed")
+    with app.app_context():
+        duplicated = db.session.execute(
+            sa.select(Blob.cursor, sa.func.count()).group_by(Blob.cursor).having(sa.func.count() > 1)
+        ).all()
+        if duplicated:
+            failures.append(f"cursors shared by live blobs: {duplicated}")
+        blobs = db.session.scalars(sa.select(Blob)).all()
+        for blob in blobs:
+            filepath = blob.filepath()
+            if not filepath.exists() or sha256(filepath.read_bytes()).hexdigest() != blob.sha256:
+                failures.append(f"blob {blob.sha256} at cursor {blob.cursor} is missing or corrupted")
+
+    reused = len(issued) - len(set(issued))
+    print(f"{len(issued)} uploads by {args.processes} processes in {elapsed:.2f}s "
+          f"({len(issued) / elapsed:.0f}/s), {len(blobs)} live blobs, {reused} cursors reused")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# dave/benchmarks/json_serialization.py
+"""
+Times serializing a listing of N resources two ways: model to_dict() encoded
+by Flask's default JSON provider, against the per-model serializers over
+column rows encoded by the fast provider (orjson when installed).
+
+    python -m benchmarks.json_serialization --rows 10000 --repeat 5
+"""
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta
+import time
+from typing import Callable
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.jsonprovider import ORJSONProvider, orjson
+from app.models import Image, ImageType, TextHTML, User
+from app.serializers import (
+    IMAGE_COLUMNS, TEXT_HTML_COLUMNS, image_rows_to_dicts, text_html_rows_to_dicts, user_row_to_dict
+)
+from benchmarks.common import make_app
+
+
+def best_of(repeat: int, function: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def as_rows(instances: list, columns: tuple) -> list:
+    Row = namedtuple('Row', [column.key for column in columns])
+    return [Row(*(getattr(instance, column.key) for column in columns)) for instance in instances]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--authors', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    app = make_app()
+    default = DefaultJSONProvider(app)
+    fast = ORJSONProvider(app) if orjson is not None else default
+    now = datetime.utcnow()
+    users = [
+        User(id=number, username=f'user{number}', email=f'user{number}@example.com',
+             text_htmls_counter=number, images_counter=number)
+        for number in range(1, arguments.authors + 1)
+    ]
+    text_htmls = [
+        TextHTML(id=number, label=f'label{number}', timestamp=now - timedelta(seconds=number),
+                 user_id=number % arguments.authors + 1)
+        for number in range(arguments.rows)
+    ]
+    images = [
+        Image(id=number, label=f'label{number}', timestamp=now - timedelta(seconds=number),
+              image_type=ImageType.PNG, user_id=number % arguments.authors + 1)
+        for number in range(arguments.rows)
+    ]
+    # Stand-ins for the rows the listing queries return instead of model instances
+    text_html_rows = as_rows(text_htmls, TEXT_HTML_COLUMNS)
+    image_rows = as_rows(images, IMAGE_COLUMNS)
+
+    scenarios = {
+        'text_html': (
+            lambda: default.dumps({'items': [row.to_dict() for row in text_htmls]}),
+            lambda: fast.dumps({'items': text_html_rows_to_dicts(text_html_rows)})
+        ),
+        'image': (
+            lambda: default.dumps({'items': [row.to_dict() for row in images]}),
+            lambda: fast.dumps({'items': image_rows_to_dicts(image_rows)})
+        ),
+        'user': (
+            lambda: [default.dumps(user.to_dict()) for user in users * (arguments.rows // len(users))],
+            lambda: [fast.dumps(user_row_to_dict(user)) for user in users * (arguments.rows // len(users))]
+        ),
+    }
+    print(f"{arguments.rows} rows, best of {arguments.repeat}; fast provider: {type(fast).__name__}")
+    print(f"{'model':<12}{'to_dict+json':>14}{'serializer+fast':>18}{'speedup':>10}")
+    with app.test_request_context():
+        for name, (baseline, optimized) in scenarios.items():
+            slow = best_of(arguments.repeat, baseline)
+            quick = best_of(arguments.repeat, optimized)
+            print(f"{name:<12}{slow * 1000:>12.1f}ms{quick * 1000:>16.1f}ms{slow / quick:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
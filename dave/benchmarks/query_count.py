@@ -0,0 +1,105 @@
+# dave/benchmarks/query_count.py
+"""
+Counts the SQL statements each listing issues for growing page sizes. A
+listing that loads authors one by one shows up as a count that grows with
+the page; the serialization layer should keep every count constant.
+
+    python -m benchmarks.query_count --users 20 --rows 1000 --sizes 10 100 1000
+"""
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask_login import FlaskLoginClient
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from app.extensions import db
+from app.models import TextHTML, User
+from benchmarks.common import make_app
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+@contextmanager
+def counting(engine: sa.Engine):
+    counter = QueryCounter()
+    sa.event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', counter)
+
+
+def seed(users: int, rows: int) -> None:
+    start = datetime.utcnow()
+    for number in range(users):
+        user = User(username=f'user{number}', email=f'user{number}@example.com')
+        db.session.add(user)
+        db.session.flush()
+        db.session.execute(sa.insert(TextHTML), [
+            {
+                'label': f'u{number}r{row}',
+                'content': f'<p>document {row} of user {number}</p>',
+                'user_id': user.id,
+                'timestamp': start - timedelta(seconds=row)
+            }
+            for row in range(rows)
+        ])
+        user.text_htmls_counter = rows
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=1000, help='rows per user')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    arguments = parser.parse_args()
+
+    app = make_app(API_MAX_PAGE_SIZE=max(arguments.sizes))
+    app.test_client_class = FlaskLoginClient
+    with app.app_context():
+        seed(arguments.users, arguments.rows)
+        author = db.session.scalar(sa.select(User).order_by(User.id))
+        engine = db.engine
+
+    print(f"{'scenario':<28}" + ''.join(f"{size:>8}" for size in arguments.sizes))
+    scenarios = {
+        'page (json)': lambda client, size: client.get(f'/api/text_html_set?limit={size}'),
+        'page (ndjson)': lambda client, size: client.get(f'/api/text_html_set?format=ndjson&limit={size}'),
+    }
+    for name, request in scenarios.items():
+        counts = []
+        for size in arguments.sizes:
+            with app.test_client(user=author) as client:
+                client.get('/test')
+                with counting(engine) as counter:
+                    response = request(client, size)
+                    response.get_data()
+                counts.append(counter.count)
+        print(f"{name:<28}" + ''.join(f"{count:>8}" for count in counts))
+
+    # Rows of many authors, as a cross-user listing or search returns them
+    for name, options in (('orm, lazy authors', ()), ('orm, selectin authors', (so.selectinload(TextHTML.author),))):
+        counts = []
+        for size in arguments.sizes:
+            with app.test_request_context():
+                db.session.expunge_all()
+                with counting(engine) as counter:
+                    rows = db.session.scalars(
+                        sa.select(TextHTML).order_by(TextHTML.id % arguments.users, TextHTML.id).limit(size).options(*options)
+                    ).all()
+                    [(row.to_dict(), row.author.username) for row in rows]
+                counts.append(counter.count)
+        print(f"{name:<28}" + ''.join(f"{count:>8}" for count in counts))
+
+
+if __name__ == '__main__':
+    main()
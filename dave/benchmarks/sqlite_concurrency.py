@@ -0,0 +1,109 @@
+# dave/benchmarks/sqlite_concurrency.py
+"""
+Write throughput of several worker processes sharing one SQLite database,
+as under gunicorn, with SQLITE_PROFILE 'default' and 'production'. Each
+process runs threads that create documents and read listings; writes that
+fail with "database is locked" are counted, not retried.
+
+    python -m benchmarks.sqlite_concurrency --processes 8 --threads 1 --writes 200
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+
+import sqlalchemy as sa
+
+from app.dbops import DBOps
+from app.extensions import db
+from app.models import User
+from benchmarks.common import make_app
+
+CONTENT = "<p>" + "lorem ipsum dolor sit amet " * 20 + "</p>"
+
+
+def client(app, user_id: int, writes: int, reads_per_write: int, counts: dict, lock: threading.Lock) -> None:
+    written = locked = 0
+    with app.app_context():
+        author = db.session.get(User, user_id)
+        for _ in range(writes):
+            try:
+                DBOps.create_text_html(CONTENT, author)
+                written += 1
+            except sa.exc.OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                db.session.rollback()
+                locked += 1
+            for _ in range(reads_per_write):
+                DBOps.page_text_html_rows(author, None, 20)
+                db.session.commit()
+    with lock:
+        counts['written'] += written
+        counts['locked'] += locked
+
+
+def worker(app, user_id: int, threads: int, writes: int, reads_per_write: int, results) -> None:
+    counts = {'written': 0, 'locked': 0}
+    lock = threading.Lock()
+    clients = [
+        threading.Thread(target=client, args=(app, user_id, writes, reads_per_write, counts, lock))
+        for _ in range(threads)
+    ]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    results.put(counts)
+
+
+def run(profile: str, arguments: argparse.Namespace) -> dict:
+    # No connect_args timeout: measure what the profile itself provides
+    app = make_app(SQLITE_PROFILE=profile, SQLALCHEMY_ENGINE_OPTIONS={})
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(app, user_id, arguments.threads, arguments.writes, arguments.reads, results)
+        )
+        for _ in range(arguments.processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    totals = {'written': 0, 'locked': 0}
+    for _ in processes:
+        for key, value in results.get().items():
+            totals[key] += value
+    for process in processes:
+        process.join()
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=1, help='clients per process (1 for gunicorn sync workers)')
+    parser.add_argument('--writes', type=int, default=200, help='documents created per client')
+    parser.add_argument('--reads', type=int, default=2, help='listing reads after each write')
+    arguments = parser.parse_args()
+
+    attempted = arguments.processes * arguments.threads * arguments.writes
+    print(f"{arguments.processes} processes x {arguments.threads} clients x {arguments.writes} writes")
+    print(f"{'profile':<12}{'seconds':>10}{'writes/s':>12}{'locked':>10}")
+    for profile in ('default', 'production'):
+        totals = run(profile, arguments)
+        print(f"{profile:<12}{totals['seconds']:>10.2f}{totals['written'] / totals['seconds']:>12.0f}"
+              f"{totals['locked']:>7}/{attempted}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,13 +23,89 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI') or 'sqlite:///' + str(Path(store_path, 'app.db'))
     LOGGING_LEVEL = os.environ.get('LOGGING_LEVEL') or 'DEBUG'
+    # LOGS_PATH/application.jsonl, written by a background thread; records beyond the queue are dropped
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES') or 10 * 1024 * 1024) # per file before rotating
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 10)
+    # Request latency, SQL and image I/O metrics on GET /metrics (Prometheus text format)
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    # Opt-in profiling; `flask profile queries|stacks` summarizes what they write under LOGS_PATH
+    PROFILE_SLOW_QUERY_MS = float(os.environ.get('PROFILE_SLOW_QUERY_MS') or 0) # 0: off; slower statements are logged
+    PROFILE_EXPLAIN = (os.environ.get('PROFILE_EXPLAIN') or 'true').lower() in ('1', 'true', 'yes') # with their plans
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0) # share of requests sampled, e.g. 0.01
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL') or 0.005) # seconds between samples
     ADMIN = os.environ.get('ADMIN') or 'admin'
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read-only DBOps methods query one of these, e.g. 'sqlite:////srv/replica.db postgresql://replica/dave'
+    REPLICA_DATABASE_URIS = tuple((os.environ.get('REPLICA_DATABASE_URIS') or '').split())
+    REPLICA_READ_YOUR_WRITES = int(os.environ.get('REPLICA_READ_YOUR_WRITES') or 5) # seconds on the primary after a write
+    # 'production' runs SQLite in WAL mode with the settings below, for several worker processes
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'default' # 'default' or 'production'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 2**20) # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or 64 * 2**10) # KiB per connection
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000) # milliseconds
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE') or 4) # connections per process
+    SQLITE_POOL_OVERFLOW = int(os.environ.get('SQLITE_POOL_OVERFLOW') or 4)
     STORE_PATH = str(store_path)
     UPLOADS_FOLDER = str(Storage.container(store_path, "images")) # Storage.container creates the folder in case it doesn't exist
+    PARTIALS_FOLDER = str(Storage.container(store_path, "partials")) # Resumable uploads in progress
     LOGS_PATH = str(logs_path)
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'html'} # Allowed file types
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE') or 100)
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE') or 1000)
+    # Async views for listings and image uploads and reads (needs flask[async], sqlalchemy[asyncio] and
+    # aiosqlite or asyncpg). Under WSGI each request still holds a worker thread until it is sent
+    API_ASYNC = (os.environ.get('API_ASYNC') or '').lower() in ('1', 'true', 'yes')
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI') or '' # default: the database URI with its async driver
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto' # 'auto', 'fts5', 'postgres' or 'like'
+    SEARCH_LIKE_MAX_ROWS = int(os.environ.get('SEARCH_LIKE_MAX_ROWS') or 10000) # newest rows a 'like' search decompresses before it reports truncated results
+    # POST /api/text_html_set/batch: documents per transaction, and per request
+    TEXT_HTML_BATCH_CHUNK = int(os.environ.get('TEXT_HTML_BATCH_CHUNK') or 500)
+    TEXT_HTML_BATCH_MAX_ITEMS = int(os.environ.get('TEXT_HTML_BATCH_MAX_ITEMS') or 50000)
+    TEXT_HTML_BATCH_MAX_BYTES = int(os.environ.get('TEXT_HTML_BATCH_MAX_BYTES') or 256 * 1024 * 1024) # request bodies
+    # TextHTML.content at rest: 'auto' (zstd when installed, else zlib), 'zstd', 'zlib' or 'none'
+    CONTENT_CODEC = os.environ.get('CONTENT_CODEC') or 'auto'
+    CONTENT_COMPRESSION_LEVEL = int(os.environ.get('CONTENT_COMPRESSION_LEVEL') or 0) # 0: the codec's default
+    CONTENT_MIN_SIZE = int(os.environ.get('CONTENT_MIN_SIZE') or 64) # bytes; shorter documents are stored as is
+    CONTENT_DICTIONARIES_PATH = str(Storage.container(store_path, "dictionaries"))
+    CONTENT_DICTIONARY = int(os.environ.get('CONTENT_DICTIONARY') or 0) # zstd dictionary id from `flask content train`
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER') or 'auto' # 'auto', 'orjson' or 'default'
+    # Bearer token -> user snapshot, per process; 0 disables it. Entries are checked against the user's
+    # stamp file, so USER_STAMPS_PATH must be shared by every worker that verifies tokens
+    TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE') or 4096)
+    TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL') or 30) # seconds; bounds changes made outside the app
+    USER_STAMPS_PATH = str(Storage.container(store_path, "user_stamps"))
+    # Server-side cache of serialized listings, keyed by user, user version and query; 0 disables it
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE') or 0)
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL') or 300)
+    # Cursors each worker reserves per round trip; unused ones are freed at exit
+    CURSOR_BLOCK_SIZE = int(os.environ.get('CURSOR_BLOCK_SIZE') or 16)
+    MAX_IMAGE_SIZE = int(os.environ.get('MAX_IMAGE_SIZE') or 32 * 1024 * 1024) # bytes
+    # POST /api/image_set/batch
+    IMAGE_BATCH_MAX_ITEMS = int(os.environ.get('IMAGE_BATCH_MAX_ITEMS') or 1000)
+    IMAGE_BATCH_MAX_BYTES = int(os.environ.get('IMAGE_BATCH_MAX_BYTES') or 1024 * 1024 * 1024) # multipart bodies
+    IMAGE_BATCH_WORKERS = int(os.environ.get('IMAGE_BATCH_WORKERS') or 4) # threads hashing and moving files
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600) # seconds since last activity
+    # Image downloads: USE_X_SENDFILE hands files to Apache/lighttpd, IMAGES_ACCEL_REDIRECT
+    # names the nginx internal location that aliases UPLOADS_FOLDER
+    USE_X_SENDFILE = (os.environ.get('USE_X_SENDFILE') or '').lower() in ('1', 'true', 'yes')
+    IMAGES_ACCEL_REDIRECT = os.environ.get('IMAGES_ACCEL_REDIRECT') or ''
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE') or 24 * 3600) # seconds
+    # Resized renditions, rendered on first request by a process pool (needs Pillow)
+    DERIVATIVE_WIDTHS = (64, 128, 256, 512, 1024, 2048)
+    DERIVATIVE_WORKERS = int(os.environ.get('DERIVATIVE_WORKERS') or 2)
+    DERIVATIVE_WAIT = float(os.environ.get('DERIVATIVE_WAIT') or 2.0) # seconds before answering 202
+    DERIVATIVES_MAX_BYTES = int(os.environ.get('DERIVATIVES_MAX_BYTES') or 1024 * 1024 * 1024)
+    # Background jobs, run by `flask worker`
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2) # processes
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1.0) # seconds
+    JOB_LEASE = float(os.environ.get('JOB_LEASE') or 300) # seconds before a silent worker's jobs are run again
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    JOB_BACKOFF = float(os.environ.get('JOB_BACKOFF') or 10) # seconds, doubled after every failed attempt
+    JOB_RETENTION = int(os.environ.get('JOB_RETENTION') or 7 * 24 * 3600) # seconds finished jobs are kept
+    STRIP_IMAGE_METADATA = (os.environ.get('STRIP_IMAGE_METADATA') or 'true').lower() in ('1', 'true', 'yes') # EXIF/XMP dropped from JPEGs on upload
+    DERIVATIVE_PREWARM_WIDTHS = (256,) # rendered by the image.postprocess job
 
 # --- requirements.txt ---
 # Create a file named requirements.txt in the root directory
@@ -0,0 +1,78 @@
+"""Index text_html for search from the application instead of triggers.
+
+The FTS5 triggers read content through dave_inflate, an SQL function only
+the app registers on its connections, so any other sqlite3 connection could
+not insert, update or delete text_html rows. DBOps now writes the index. On
+PostgreSQL the plaintext terms go to a tsvector column with a GIN index.
+
+Revision ID: 0c3e5f7a9b21
+Revises: e2b7c4f90d16
+Create Date: 2026-10-18 23:12:05.406118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.compression import content_codec
+
+
+# revision identifiers, used by Alembic.
+revision = '0c3e5f7a9b21'
+down_revision = 'e2b7c4f90d16'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+FTS_TRIGGERS = ('text_html_fts_ai', 'text_html_fts_ad', 'text_html_fts_au')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for trigger in FTS_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE text_html ADD COLUMN search_vector tsvector")
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.text("SELECT id, content FROM text_html WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {'last_id': last_id, 'limit': BATCH_SIZE}
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            changes = [
+                {'id': row.id, 'content': content_codec.decode(row.content)}
+                for row in rows if row.content is not None
+            ]
+            if changes:
+                bind.execute(
+                    sa.text("UPDATE text_html SET search_vector = to_tsvector('simple', :content) WHERE id = :id"),
+                    changes
+                )
+        op.execute("CREATE INDEX ix_text_html_search_vector ON text_html USING gin (search_vector)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS text_html_fts_ai AFTER INSERT ON text_html BEGIN "
+            "INSERT INTO text_html_fts(rowid, content) VALUES (new.id, dave_inflate(new.content)); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS text_html_fts_ad AFTER DELETE ON text_html BEGIN "
+            "INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, dave_inflate(old.content)); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS text_html_fts_au AFTER UPDATE OF content ON text_html BEGIN "
+            "INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, dave_inflate(old.content)); "
+            "INSERT INTO text_html_fts(rowid, content) VALUES (new.id, dave_inflate(new.content)); END"
+        )
+        # Rows written while the triggers were gone
+        op.execute("INSERT INTO text_html_fts(text_html_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_text_html_search_vector")
+        op.execute("ALTER TABLE text_html DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,35 @@
+"""Denormalized per-user resource counters.
+
+Revision ID: 2e8c5a1f7b39
+Revises: 9b4f2e6a0d17
+Create Date: 2026-10-18 16:41:05.226718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e8c5a1f7b39'
+down_revision = '9b4f2e6a0d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('text_htmls_counter', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('images_counter', sa.Integer(), server_default='0', nullable=False))
+
+    # Start from exact counts; `flask users reconcile` repairs any later drift
+    op.execute(
+        'UPDATE "user" SET '
+        'text_htmls_counter = (SELECT COUNT(*) FROM text_html WHERE text_html.user_id = "user".id), '
+        'images_counter = (SELECT COUNT(*) FROM image WHERE image.user_id = "user".id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('images_counter')
+        batch_op.drop_column('text_htmls_counter')
@@ -0,0 +1,26 @@
+"""Composite index for keyset pagination of text_html.
+
+Revision ID: 3f9a1c2d7e41
+Revises: 7c5a74e1bdf2
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7e41'
+down_revision = '7c5a74e1bdf2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('text_html', schema=None) as batch_op:
+        batch_op.create_index('ix_text_html_user_id_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('text_html', schema=None) as batch_op:
+        batch_op.drop_index('ix_text_html_user_id_timestamp_id')
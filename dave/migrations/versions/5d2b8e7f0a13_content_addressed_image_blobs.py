@@ -0,0 +1,53 @@
+"""Content-addressed, reference-counted image blobs.
+
+Revision ID: 5d2b8e7f0a13
+Revises: a81e5d0c94b7
+Create Date: 2026-10-18 11:26:05.731904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b8e7f0a13'
+down_revision = 'a81e5d0c94b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('cursor', sa.Integer(), nullable=False),
+    sa.Column('image_type', sa.Enum('PNG', 'JPG', 'JPEG', 'GIF', name='imagetype'), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('blob', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_blob_cursor'), ['cursor'], unique=True)
+        batch_op.create_index(batch_op.f('ix_blob_sha256'), ['sha256'], unique=True)
+
+    # Image rows now point at a blob instead of owning a file through 'count'
+    with op.batch_alter_table('image', schema=None) as batch_op:
+        batch_op.drop_column('count')
+        batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=False))
+        batch_op.create_index(batch_op.f('ix_image_blob_id'), ['blob_id'], unique=False)
+        batch_op.create_foreign_key(batch_op.f('fk_image_blob_id_blob'), 'blob', ['blob_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('image', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_image_blob_id_blob'), type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_image_blob_id'))
+        batch_op.drop_column('blob_id')
+        batch_op.add_column(sa.Column('count', sa.Integer(), nullable=False))
+
+    with op.batch_alter_table('blob', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_blob_sha256'))
+        batch_op.drop_index(batch_op.f('ix_blob_cursor'))
+
+    op.drop_table('blob')
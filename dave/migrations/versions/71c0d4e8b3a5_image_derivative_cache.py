@@ -0,0 +1,40 @@
+"""Image derivative cache entries.
+
+Revision ID: 71c0d4e8b3a5
+Revises: e3b7a6c51f92
+Create Date: 2026-10-18 15:08:43.917266
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71c0d4e8b3a5'
+down_revision = 'e3b7a6c51f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('derivative',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('blob_id', sa.Integer(), nullable=False),
+    sa.Column('variant', sa.String(length=32), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('last_access', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['blob_id'], ['blob.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('blob_id', 'variant')
+    )
+    with op.batch_alter_table('derivative', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_derivative_blob_id'), ['blob_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_derivative_last_access'), ['last_access'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('derivative', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_derivative_last_access'))
+        batch_op.drop_index(batch_op.f('ix_derivative_blob_id'))
+
+    op.drop_table('derivative')
@@ -0,0 +1,49 @@
+"""Full-text search index for text_html content.
+
+Revision ID: a81e5d0c94b7
+Revises: 3f9a1c2d7e41
+Create Date: 2026-10-18 10:03:47.118520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81e5d0c94b7'
+down_revision = '3f9a1c2d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite only; other databases fall back to the 'like' search backend
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE text_html_fts USING fts5("
+        "content, content='text_html', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_ai AFTER INSERT ON text_html BEGIN "
+        "INSERT INTO text_html_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_ad AFTER DELETE ON text_html BEGIN "
+        "INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_au AFTER UPDATE OF content ON text_html BEGIN "
+        "INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO text_html_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute("INSERT INTO text_html_fts(text_html_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS text_html_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS text_html_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS text_html_fts_ai")
+    op.execute("DROP TABLE IF EXISTS text_html_fts")
@@ -0,0 +1,35 @@
+"""Per-user change version and last modification time.
+
+Revision ID: b6d1e9a3c0f7
+Revises: f61c2b9d8a45
+Create Date: 2026-10-18 19:12:47.503918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1e9a3c0f7'
+down_revision = 'f61c2b9d8a45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_modified', sa.DateTime(), nullable=True))
+
+    # Deletions left no trace, so the newest resource is the best guess
+    op.execute(
+        'UPDATE "user" SET last_modified = (SELECT MAX(timestamp) FROM ('
+        'SELECT timestamp FROM text_html WHERE text_html.user_id = "user".id '
+        'UNION ALL SELECT timestamp FROM image WHERE image.user_id = "user".id))'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('last_modified')
+        batch_op.drop_column('version')
@@ -0,0 +1,38 @@
+"""Cursor sequence and free list for blob storage cursors.
+
+Revision ID: c47e09b2f6d8
+Revises: 5d2b8e7f0a13
+Create Date: 2026-10-18 12:41:52.260338
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e09b2f6d8'
+down_revision = '5d2b8e7f0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cursor_sequence',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('free_cursor',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('cursor', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'cursor')
+    )
+    op.execute(
+        "INSERT INTO cursor_sequence (name, next_value) "
+        "SELECT 'blob', COALESCE(MAX(cursor), -1) + 1 FROM blob"
+    )
+
+
+def downgrade():
+    op.drop_table('free_cursor')
+    op.drop_table('cursor_sequence')
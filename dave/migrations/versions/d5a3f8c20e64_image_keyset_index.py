@@ -0,0 +1,26 @@
+"""Composite index for image keyset pagination.
+
+Revision ID: d5a3f8c20e64
+Revises: 2e8c5a1f7b39
+Create Date: 2026-10-18 17:20:51.604413
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a3f8c20e64'
+down_revision = '2e8c5a1f7b39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('image', schema=None) as batch_op:
+        batch_op.create_index('ix_image_user_id_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('image', schema=None) as batch_op:
+        batch_op.drop_index('ix_image_user_id_timestamp_id')
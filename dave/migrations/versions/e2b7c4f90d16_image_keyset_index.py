@@ -0,0 +1,34 @@
+"""Composite index for image keyset pagination, where d5a3f8c20e64 did not create it.
+
+Databases migrated while d5a3f8c20e64 was briefly out of the history went
+from 2e8c5a1f7b39 straight to f61c2b9d8a45 and lack the index; the others
+already have it. The index belongs to d5a3f8c20e64, so downgrading this
+revision leaves it in place.
+
+Revision ID: e2b7c4f90d16
+Revises: b6d1e9a3c0f7
+Create Date: 2026-10-18 20:26:40.118273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c4f90d16'
+down_revision = 'b6d1e9a3c0f7'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_image_user_id_timestamp_id'
+
+
+def upgrade():
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('image')}
+    if INDEX not in indexes:
+        with op.batch_alter_table('image', schema=None) as batch_op:
+            batch_op.create_index(INDEX, ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    pass
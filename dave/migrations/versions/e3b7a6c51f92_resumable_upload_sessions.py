@@ -0,0 +1,40 @@
+"""Resumable image upload sessions.
+
+Revision ID: e3b7a6c51f92
+Revises: c47e09b2f6d8
+Create Date: 2026-10-18 13:55:19.604471
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7a6c51f92'
+down_revision = 'c47e09b2f6d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_session',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('image_type', sa.Enum('PNG', 'JPG', 'JPEG', 'GIF', name='imagetype'), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('expiration', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_upload_session_expiration'), ['expiration'], unique=False)
+        batch_op.create_index(batch_op.f('ix_upload_session_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('upload_session', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_upload_session_user_id'))
+        batch_op.drop_index(batch_op.f('ix_upload_session_expiration'))
+
+    op.drop_table('upload_session')
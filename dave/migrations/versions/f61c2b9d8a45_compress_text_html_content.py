@@ -0,0 +1,119 @@
+"""Compress text_html content at rest.
+
+Revision ID: f61c2b9d8a45
+Revises: d5a3f8c20e64
+Create Date: 2026-10-18 18:04:12.550931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.compression import content_codec
+
+
+# revision identifiers, used by Alembic.
+revision = 'f61c2b9d8a45'
+down_revision = 'd5a3f8c20e64'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+FTS_TRIGGERS = ('text_html_fts_ai', 'text_html_fts_ad', 'text_html_fts_au')
+
+
+def create_fts(source):
+    """FTS5 index over source; value is the SQL expression for a trigger row's content."""
+    table, value = ('text_html_plain', 'dave_inflate({}.content)') if source == 'plain' else ('text_html', '{}.content')
+    op.execute(
+        "CREATE VIRTUAL TABLE text_html_fts USING fts5("
+        f"content, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_ai AFTER INSERT ON text_html BEGIN "
+        f"INSERT INTO text_html_fts(rowid, content) VALUES (new.id, {value.format('new')}); END"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_ad AFTER DELETE ON text_html BEGIN "
+        f"INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, {value.format('old')}); END"
+    )
+    op.execute(
+        "CREATE TRIGGER text_html_fts_au AFTER UPDATE OF content ON text_html BEGIN "
+        f"INSERT INTO text_html_fts(text_html_fts, rowid, content) VALUES ('delete', old.id, {value.format('old')}); "
+        f"INSERT INTO text_html_fts(rowid, content) VALUES (new.id, {value.format('new')}); END"
+    )
+    op.execute("INSERT INTO text_html_fts(text_html_fts) VALUES ('rebuild')")
+
+
+def drop_fts():
+    for trigger in FTS_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS text_html_fts")
+
+
+def convert_rows(convert):
+    """Rewrites content in batches of ids, skipping values convert leaves unchanged."""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text("SELECT id, content FROM text_html WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        changes = []
+        for row in rows:
+            value = convert(row.content)
+            if value is not row.content:
+                changes.append({'id': row.id, 'content': value})
+        if changes:
+            bind.execute(sa.text("UPDATE text_html SET content = :content WHERE id = :id"), changes)
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        # Re-indexing once at the end is cheaper than firing the triggers on every row
+        drop_fts()
+    else:
+        with op.batch_alter_table('text_html', schema=None) as batch_op:
+            batch_op.alter_column('content',
+                   existing_type=sa.Text(),
+                   type_=sa.LargeBinary(),
+                   existing_nullable=True,
+                   postgresql_using="convert_to(content, 'UTF8')")
+
+    # Legacy rows are str on SQLite and UTF-8 bytes elsewhere; content_codec reads both
+    convert_rows(lambda value: value if content_codec.is_current(value) else content_codec.encode(content_codec.decode(value)))
+
+    if sqlite:
+        op.execute("CREATE VIEW text_html_plain AS SELECT id, dave_inflate(content) AS content FROM text_html")
+        create_fts('plain')
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        drop_fts()
+        op.execute("DROP VIEW IF EXISTS text_html_plain")
+
+    def plaintext(value):
+        if value is None or isinstance(value, str):
+            return value
+        # Back to TEXT on SQLite; elsewhere UTF-8 bytes, for convert_from below
+        text = content_codec.decode(value)
+        return text if sqlite else text.encode('utf-8')
+
+    convert_rows(plaintext)
+
+    if sqlite:
+        create_fts('text')
+    else:
+        with op.batch_alter_table('text_html', schema=None) as batch_op:
+            batch_op.alter_column('content',
+                   existing_type=sa.LargeBinary(),
+                   type_=sa.Text(),
+                   existing_nullable=True,
+                   postgresql_using="convert_from(content, 'UTF8')")
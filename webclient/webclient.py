@@ -1,3 +1,4 @@
+from concurrent.futures import as_completed, ThreadPoolExecutor
 import contextlib
 import json
 import logging
@@ -6,8 +7,13 @@ from pathlib import Path
 
 from random import choices
 import sys
+import threading
+import time
+from typing import BinaryIO, Iterable, Iterator, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class LoggedException(Exception):
@@ -16,9 +22,21 @@ class LoggedException(Exception):
         logging.error(message)
 
 
+class ApiError(LoggedException):
+    def __init__(self, response: requests.Response) -> None:
+        try:
+            payload = response.json()
+            message = payload.get("message") or payload.get("error") or response.reason
+        except ValueError:
+            message = response.reason
+        super().__init__(f"{response.request.method:s} {response.url:s}: {response.status_code:d} {message}")
+        self.response = response
+        self.status_code = response.status_code
+
+
 root_url = os.environ.get("WEBSITE") or "http://127.0.0.1:5000"
 user_url = f"{root_url:s}/api/user"
-token_url = f"{root_url:s}/api/token"
+token_url = f"{root_url:s}/api/tokens"
 current_user_url = f"{root_url:s}/api/user/current"
 text_html_url = f"{root_url:s}/api/text_html_set"
 image_url = f"{root_url:s}/api/image_set"
@@ -27,18 +45,50 @@ image_url = f"{root_url:s}/api/image_set"
 store_path = Path("~", "Info", "dave", "webclient", "store").expanduser()
 store_path.mkdir(mode=0o700, parents=True, exist_ok=True)
 
+IMAGE_MIMETYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".gif": "image/gif"}
+HTML_EXTENSIONS = {".html", ".htm"}
+# Seconds before a token's expiry when it is renewed. The server hands out the current token
+# again while it has more than a minute left, so this must stay under that
+TOKEN_RENEWAL_MARGIN = 30
+
+
+def pooled_session(pool_size: int = 10, retries: int = 3, backoff: float = 0.5) -> requests.Session:
+    """
+    A Session keeping up to pool_size connections alive. Connections that
+    cannot be established are retried with exponential backoff whatever the
+    method; 429, 502, 503 and 504 answers and broken reads only for
+    idempotent methods, since a POST may have been carried out already.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared by the module level functions, so consecutive calls reuse their connections
+session = pooled_session()
+
 
 def create_user(username: str, email: str, password: str) -> requests.Response:
     payload = {"username": username, "email": email, "password": password, "repeat_password": password}
-    response = requests.post(user_url, json=payload)
+    response = session.post(user_url, json=payload)
     return response
 
 def login_user(username: str, password: str) -> requests.Response:
-    return requests.post(token_url, auth=requests.auth.HTTPBasicAuth(username, password))
+    return session.post(token_url, auth=requests.auth.HTTPBasicAuth(username, password))
 
 
 def get_current_user(auth_headers: dict[str, str]) -> requests.Response:
-    return requests.get(current_user_url, headers=auth_headers)
+    return session.get(current_user_url, headers=auth_headers)
 
 
 def get_token_headers(token: str) -> dict[str, str]:
@@ -51,46 +101,199 @@ def get_token_headers(token: str) -> dict[str, str]:
 # https://forpythons.com/how-to-upload-file-with-python-requests/
 
 
-def get_filename_and_mimetype(image_file): 
-    filename = image_file.name # todo    
-    mimetype = ""
-    parts = filename.split(".")
+def get_filename_and_mimetype(image_file):
+    filename = Path(image_file.name).name
+    extension = Path(filename).suffix.lower()
+    if not extension:
+        raise LoggedException(f"Skipping file {filename:s} with no extension. We dont guess mimetypes!")
     try:
-        extension = parts[1]
-        if extension == "jpg" or extension == "jpeg":
-            mimetype = "image/jpeg"
-        elif extension == "png":
-            mimetype = "image/png"
-        else:
-            message = f"Unexpected extension/mimetype {extension:s}"
-            raise LoggedException(message)
-    except IndexError:
-        message = f"Skipping file {filename:s} with no extension. We dont guess mimetypes!"
-        raise LoggedException(message)
-    except ValueError as message:
-        raise LoggedException(f"{str(message):s}")
+        mimetype = IMAGE_MIMETYPES[extension]
+    except KeyError:
+        raise LoggedException(f"Unexpected extension/mimetype {extension:s}")
     return filename, mimetype
 
 
 def publish_post(auth_headers: dict[str, str], content: str) -> requests.Response:
-    payload = {"content": content}
-    response = requests.post(text_html_url,
-                             headers=auth_headers, 
-                             json=payload)
+    payload = [{"content": content}]
+    response = session.post(f"{text_html_url:s}/batch",
+                            headers=auth_headers,
+                            json=payload)
     return response
 
 
-def publish_picture(auth_headers: dict[str, str], image_file, resource_uuid):
+def publish_picture(auth_headers: dict[str, str], image_file):
     filename, mimetype = get_filename_and_mimetype(image_file)
-    print("publish_picture:", filename, " ", mimetype)
     payload = {
          "image": (filename, image_file, mimetype)
     }
-    response = requests.post(f"{image_url:s}/{resource_uuid:s}",
-                             headers=auth_headers, 
-                             files=payload)
+    response = session.post(image_url,
+                            headers=auth_headers,
+                            files=payload)
     return response
 
+
+class Client:
+    """
+    API client on one pooled keep-alive session, safe to share between
+    threads. After login_user it fetches a new token from /api/tokens when
+    the current one is about to expire or gets refused, and replays the
+    request once. Errors raise ApiError.
+
+        with Client() as client:
+            client.login_user("alice", "secret")
+            client.publish_post("<p>Hello</p>")
+            results = client.bulk_upload("~/Pictures/trip", workers=8)
+    """
+
+    def __init__(
+        self,
+        root_url: str = root_url,
+        pool_size: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60
+    ) -> None:
+        self.root_url = root_url.rstrip("/")
+        self.session = pooled_session(pool_size, retries, backoff)
+        self.session.headers["Accept"] = "application/json"
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._credentials: Tuple[str, str] | None = None
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def request(self, method: str, path: str, authenticated: bool = True, **kwargs) -> requests.Response:
+        """Sends the request, with the bearer token if authenticated; non 2xx answers raise ApiError."""
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.root_url:s}{path:s}"
+        headers = kwargs.pop("headers", None) or {}
+        if not authenticated:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+        else:
+            token = self.token()
+            response = self.session.request(method, url, headers={**get_token_headers(token), **headers}, **kwargs)
+            if response.status_code == 401 and self._credentials is not None:
+                # Revoked or expired early: one more try with a new token, from the start of any file body
+                body = kwargs.get("data")
+                if hasattr(body, "seek"):
+                    body.seek(0)
+                for _, part in (kwargs.get("files") or {}).items():
+                    part[1].seek(0)
+                headers = {**get_token_headers(self.token(refused=token)), **headers}
+                response = self.session.request(method, url, headers=headers, **kwargs)
+        if not response.ok:
+            raise ApiError(response)
+        return response
+
+    def token(self, refused: str | None = None) -> str:
+        """The current token, renewed when it expires soon or is the refused one."""
+        with self._token_lock:
+            if self._token is None or self._token == refused or time.monotonic() >= self._token_expires:
+                if self._credentials is None:
+                    raise LoggedException("Not logged in")
+                response = self.session.post(f"{self.root_url:s}/api/tokens",
+                                             auth=requests.auth.HTTPBasicAuth(*self._credentials),
+                                             timeout=self.timeout)
+                if not response.ok:
+                    raise ApiError(response)
+                payload = response.json()
+                self._token = payload["token"]
+                self._token_expires = time.monotonic() + payload["expires_in"] - TOKEN_RENEWAL_MARGIN
+            return self._token
+
+    def create_user(self, username: str, email: str, password: str) -> dict:
+        payload = {"username": username, "email": email, "password": password, "repeat_password": password}
+        return self.request("POST", "/api/user", authenticated=False, json=payload).json()
+
+    def login_user(self, username: str, password: str) -> str:
+        """Keeps the credentials, to renew the token with, and returns a fresh token."""
+        self._credentials = (username, password)
+        self._token = None
+        return self.token()
+
+    def logout_user(self) -> None:
+        if self._token is not None:
+            self.request("DELETE", "/api/tokens")
+        self._credentials, self._token = None, None
+
+    def get_current_user(self) -> dict:
+        return self.request("GET", "/api/user/current").json()
+
+    def publish_post(self, content: str) -> dict:
+        return self.publish_posts([content])[0]
+
+    def publish_posts(self, contents: Iterable[str]) -> list[dict]:
+        """Creates the documents in one request; returns the server's result for each, in order."""
+        payload = [{"content": content} for content in contents]
+        return self.request("POST", "/api/text_html_set/batch", json=payload).json()["items"]
+
+    def publish_picture(self, image_file: str | Path | BinaryIO) -> dict:
+        """Uploads an image from a path or an open binary file, streaming it as the request body."""
+        with contextlib.ExitStack() as stack:
+            if isinstance(image_file, (str, Path)):
+                image_file = stack.enter_context(open(Path(image_file).expanduser(), "rb"))
+            _, mimetype = get_filename_and_mimetype(image_file)
+            return self.request("POST", "/api/image_set", data=image_file,
+                                headers={"Content-Type": mimetype}).json()
+
+    def bulk_upload(
+        self,
+        directory: str | Path,
+        workers: int | None = None,
+        recursive: bool = True,
+        posts_per_request: int = 500
+    ) -> Iterator[Tuple[Path, dict | Exception]]:
+        """
+        Publishes the images and HTML files of directory from a pool of
+        workers threads (the pool size by default): one request per image,
+        and HTML files in batches of posts_per_request. Yields (path, result)
+        as uploads finish, the result being the server's answer or the
+        exception of that file; one failed file does not stop the others.
+        """
+        directory = Path(directory).expanduser()
+        paths = sorted(path for path in (directory.rglob("*") if recursive else directory.iterdir()) if path.is_file())
+        images = [path for path in paths if path.suffix.lower() in IMAGE_MIMETYPES]
+        pages = [path for path in paths if path.suffix.lower() in HTML_EXTENSIONS]
+        self.token() # once, before the workers all want one
+
+        def upload_image(path: Path) -> list[Tuple[Path, dict | Exception]]:
+            try:
+                return [(path, self.publish_picture(path))]
+            except (ApiError, OSError, LoggedException, requests.RequestException) as error:
+                return [(path, error)]
+
+        def upload_pages(batch: list[Path]) -> list[Tuple[Path, dict | Exception]]:
+            contents, readable, results = [], [], []
+            for path in batch:
+                try:
+                    contents.append(path.read_text(encoding="utf-8"))
+                    readable.append(path)
+                except (OSError, UnicodeDecodeError) as error:
+                    results.append((path, error))
+            if readable:
+                try:
+                    results.extend(zip(readable, self.publish_posts(contents)))
+                except (ApiError, requests.RequestException) as error:
+                    results.extend((path, error) for path in readable)
+            return results
+
+        batches = [pages[start:start + posts_per_request] for start in range(0, len(pages), posts_per_request)]
+        with ThreadPoolExecutor(max_workers=workers or self.pool_size) as executor:
+            futures = [executor.submit(upload_pages, batch) for batch in batches] + \
+                [executor.submit(upload_image, path) for path in images]
+            for future in as_completed(futures):
+                yield from future.result()
+
     
 def empty_data(file_identifier: str) -> dict[str, str]:
     custom_data = {"username": "", "password": "", "register": ""}
@@ -114,7 +317,7 @@ def write_data(some_data: dict[str, str], file_identifier: str) -> None:
     with open(file_identifier, "w") as target:
          json.dump(some_data, target)
 
-def report(response: Response) -> str:
+def report(response: requests.Response) -> str:
     status_code = response.status_code
     text = response.text
     print("status_code", status_code)
@@ -167,7 +370,7 @@ def get_auth_headers(username: str) -> dict[str, str]:
             raise ValueError("password unexpected null value")
         if  register == "yes":
             print("Register")
-            response = create_bot(username, password)
+            response = create_user(username, f"{username:s}@example.com", password)
             report(response)
             secret_data["user"] = response.json()
             secret_data["register"] = "no"